@@ -2,7 +2,10 @@
 This file contains the logic for Heuristic with Approximation algorithm.
 """
 
-from copy import deepcopy
+import random
+import numpy as np
+from collections import deque
+from heapq import heappop, heappush
 from typing import Tuple, List
 
 from graph import Graph
@@ -10,11 +13,30 @@ from vertex_cover import Vertex_Cover
 from utils import Timer, Trace
 
 
+APPROX_MODE = "max_degree"  # "max_degree" | "matching" | "reduction" | "random_restart"
+RESTARTS = 20   # number of greedy runs kept track of in "random_restart" mode
+
+
 class Approx:
     IS_DETERMINISTIC = True
+    COVER_CACHE = "lru"
+
+    def __init__(self, mode: str = APPROX_MODE):
+        """
+        Constructor for the Approx class
+
+        Modes:
+            max_degree: repeatedly add the vertex of maximum remaining degree (smallest id on ties)
+            matching: add both endpoints of a maximal matching (2-approximation)
+            reduction: max_degree greedy that first applies the degree-1 and degree-2 (triangle) rules
+            random_restart: best of RESTARTS max_degree greedy runs with random tie-breaking
+        """
+        if mode not in ("max_degree", "matching", "reduction", "random_restart"):
+            raise ValueError("Invalid approximation mode")
+        self.mode = mode
+        if mode == "random_restart":
+            self.IS_DETERMINISTIC = False
 
-    def __init__(self):
-        """ Constructor for the Approx class """
         if self.IS_DETERMINISTIC == None:
             raise ValueError(
                 "IS_DETERMINISTIC must be set to True or False")
@@ -56,59 +78,164 @@ class Approx:
         #
         ######################
 
-        #G_remaining = deepcopy(G)
-        G_rem=deepcopy(G.adj)
-        G_nodes=G_rem.keys()
-        G_e=G.e
-        G_v=G.v
+        if self.mode == "max_degree":
+            solution = self.get_greedy_cover()
+        elif self.mode == "matching":
+            solution = self.remove_redundant(self.get_matching_cover())
+        elif self.mode == "reduction":
+            solution = self.remove_redundant(self.get_greedy_cover(reduce=True))
+        elif self.mode == "random_restart":
+            solution = self.get_random_restart_cover()
 
-        while G_e != 0:
+        # check solution quality
+        if G.is_vertex_cover(solution):
 
-            # find the vertex with maximum degree in G_remaining and save its index and adj_num
+            quality=G.get_solution_quality(solution)
+            print(f"Solution is found with quality of {quality}.")
 
-            # set initial value of node_max[node_index, num_of_adj_nodes]
-            node_max = [-1, -1]
+        else:
 
-            for node in G_nodes:
-                if len(G_rem[node]) > node_max[1]:
-                    node_max[0] = node
-                    node_max[1] = len(G_rem[node])
+            edges_covered=G.count_covered_edges(solution)
+            total_edges=G.e
+            print(f"Solution is not found in time with {edges_covered} edges covered in total {total_edges} edges.")
 
-            # add the vertex with max degree to solution set
-            solution.append(node_max[0])
 
-            # delete the vertex with max degree and its edges in G_remaining
+        return quality, solution
+
+    def get_greedy_cover(self, rank: List[int] = None, reduce: bool = False) -> List[int]:
+        """
+        Max-degree greedy on the CSR graph, in O((V + E) log V).
 
-            G_v -= 1
-            G_e -= len(G_rem[node_max[0]])
-            for node in G_rem[node_max[0]]:
-                G_rem[node].remove(node_max[0])
-                if len(G_rem[node]) == 0:
-                    del G_rem[node]
-                    G_v = G_v-1
+        Args:
+            rank: tie-breaking priority of each node (lowest first), defaults to the node id
+            reduce: before every greedy pick, add the vertices forced by the degree-1 and degree-2 (triangle) rules
 
-            del G_rem[node_max[0]]
+        Returns:
+            solution: vertex cover as list of nodes, possibly partial if the time limit was exceeded
+        """
+        G = self.G
+        solution = []
+        if rank is None:
+            rank = range(G.v + 1)
+        order = [0] * (G.v + 1)
+        for node in G.all_nodes:
+            order[rank[node]] = node
+
+        # Bucket queue of the nodes indexed by their remaining degree. Each bucket is a min-heap of node ranks,
+        # so that among the nodes of maximum degree the one with the lowest rank is picked. Degrees only
+        # decrease, so the pointer to the highest non-empty bucket only moves down, and entries made stale
+        # by a degree change are discarded lazily when they reach the top of their bucket.
+        degree = np.diff(G.indptr).tolist()
+        removed = [False] * len(degree)
+        max_degree = max(degree)
+        buckets = [[] for _ in range(max_degree + 1)]
+        for node in order[1:]:
+            buckets[degree[node]].append(rank[node])    # ranks are visited in increasing order, so each bucket is a valid heap
+
+        # Nodes whose remaining degree dropped to 1 or 2, to be checked by the reduction rules
+        low_degree = deque(node for node in G.all_nodes if 1 <= degree[node] <= 2) if reduce else deque()
+
+        def take(node):
+            """ Adds the node to the solution and deletes it and its edges from the remaining graph """
+            solution.append(node)
+            removed[node] = True
+            degree[node] = 0
+            for neighbour in G.get_neighbours(node).tolist():
+                if not removed[neighbour]:
+                    degree[neighbour] -= 1
+                    heappush(buckets[degree[neighbour]], rank[neighbour])
+                    if reduce and 1 <= degree[neighbour] <= 2:
+                        low_degree.append(neighbour)
+
+        top = max_degree
+        while True:
+
+            # apply the reduction rules until no low degree node is left
+            while low_degree:
+                node = low_degree.popleft()
+                if removed[node] or not 1 <= degree[node] <= 2:
+                    continue
+                remaining = [neighbour for neighbour in G.get_neighbours(node).tolist() if not removed[neighbour]]
+                if len(remaining) == 1:
+                    # the only neighbour of a degree-1 node is in some minimum cover
+                    take(remaining[0])
+                elif remaining[1] in G.get_neighbours(remaining[0]).tolist():
+                    # both neighbours of a degree-2 node in a triangle are in some minimum cover
+                    take(remaining[0])
+                    take(remaining[1])
+
+            # find the vertex with maximum degree in the remaining graph
+            while top > 0 and not buckets[top]:
+                top -= 1
+            if top == 0:
+                break
+            node = order[buckets[top][0]]
+            if removed[node] or degree[node] != top:
+                heappop(buckets[top])
+                continue
 
-            G_nodes = G_rem.keys()
+            # add the vertex with max degree to solution set
+            heappop(buckets[top])
+            take(node)
 
             # check run time
-            if timer.cutoff():
+            if self.timer.cutoff():
                 break
 
-        # check solution quality
-        if G.is_vertex_cover(solution):
+        return solution
 
-            quality=G.get_solution_quality(solution)
-            print(f"Solution is found with quality of {quality}.")
+    def get_matching_cover(self) -> List[int]:
+        """ Returns both endpoints of every edge of a greedy maximal matching, in O(V + E) """
+        solution = []
+        matched = [False] * (self.G.v + 1)
+        for u, v in self.G.edges.tolist():
+            if not matched[u] and not matched[v]:
+                matched[u] = matched[v] = True
+                solution.append(u)
+                solution.append(v)
 
-        else:
+        return solution
 
-            edges_covered=G.count_covered_edges(solution)
-            total_edges=G.e
-            print(f"Solution is not found in time with {edges_covered} edges covered in total {total_edges} edges.")
+    def get_random_restart_cover(self) -> List[int]:
+        """
+        Returns the best cover found by up to RESTARTS greedy runs, the first with the default tie-breaking and the others with random ones.
+        If the time limit interrupts the first run, its partial cover is returned.
+        """
+        best = None
+        for restart in range(RESTARTS):
+            if restart > 0:
+                rank = [0] + random.sample(range(1, self.G.v + 1), self.G.v)
+                solution = self.get_greedy_cover(rank)
+            else:
+                solution = self.get_greedy_cover()
+
+            if self.timer.cutoff() and not self.G.is_vertex_cover(solution):
+                # keep the partial cover of an interrupted first run, as the max_degree mode would
+                if best is None:
+                    best = solution
+                break
+            solution = self.remove_redundant(solution, shuffle=True)
 
+            if best is None or len(solution) < len(best):
+                best = solution
+                self.trace.add_record(len(best))
 
-        return quality, solution
+            if self.timer.cutoff():
+                break
+
+        return best
+
+    def remove_redundant(self, solution: List[int], shuffle: bool = False) -> List[int]:
+        """ Removes from the cover, one at a time, the nodes whose neighbours are all in the cover """
+        in_cover = np.zeros(self.G.v + 1, dtype=bool)
+        in_cover[solution] = True
+
+        order = random.sample(solution, len(solution)) if shuffle else solution
+        for node in order:
+            if in_cover[self.G.get_neighbours(node)].all():
+                in_cover[node] = False
+
+        return [node for node in solution if in_cover[node]]
 
 
 if __name__ == "__main__":
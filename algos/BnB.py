@@ -1,165 +1,91 @@
 """
 This file contains the logic for the Branch and Bound algorithm.
 """
-#from algos.Approx import Approx
-from copy import deepcopy
-#import networkx as nx
+import numpy as np
+import threading
+import multiprocessing as mp
+from time import time
+from queue import Empty
 from typing import Tuple, List
 
 from graph import Graph
 from utils import Timer, Trace
+from lower_bounds import LOWER_BOUNDS, Degree_Bound
+
+LOWER_BOUND = "degree"  # "degree" | "matching" | "clique" | "lp"
+LB_BUILD_SHARE = 0.5    # max share of the remaining time spent building the lower bound, past it the degree bound is used
+UB_TIME = 2             # seconds given to the algorithm seeding the upper bound (Approx returns sooner)
+WORKER_GRACE = 1        # seconds the parallel workers are given past the deadline to exit before being terminated
 
 
 class BnB:
     IS_DETERMINISTIC = True
-    
-    def __init__(self):
-        """ Constructor for the BnB class """
+    COVER_CACHE = "lru"
+    shared_bound = None     # shared integer (e.g. multiprocessing.RawValue) with the best cover size known by other processes
+
+    def __init__(self, workers: int = 1, ub_algorithm: type = None, inject_algorithm: type = None, lower_bound: str = LOWER_BOUND):
+        """
+        Constructor for the BnB class
+
+        :param workers: number of processes exploring the search tree, 1 to search on the main process only
+        :param ub_algorithm: algorithm class (e.g. Approx) whose cover seeds the upper bound before the search
+        :param inject_algorithm: algorithm class (e.g. NuMVC) run in a background thread during the search,
+                                 each better cover it finds tightens the upper bound used for pruning
+        :param lower_bound: name of the lower bound used for pruning (see LOWER_BOUNDS)
+        """
         if self.IS_DETERMINISTIC == None: raise ValueError("IS_DETERMINISTIC must be set to True or False")
-    
+        if lower_bound not in LOWER_BOUNDS:
+            raise ValueError(f"Invalid lower bound {lower_bound}, expected one of {tuple(LOWER_BOUNDS)}")
+        self.workers = workers
+        self.lower_bound = lower_bound
+        self.ub_algorithm = ub_algorithm() if ub_algorithm is not None else None
+        self.inject_algorithm = inject_algorithm() if inject_algorithm is not None else None
+
+        if (self.ub_algorithm is not None and not self.ub_algorithm.IS_DETERMINISTIC) or self.inject_algorithm is not None:
+            self.IS_DETERMINISTIC = False
+
     def get_vertex_cover(self, G: Graph, timer: Timer, trace: Trace) -> Tuple[int, List[int]]:
         """
         Branch and Bound algorithm implementation.
-        
+
+        The remaining graph is never copied: removing a vertex updates the degrees of its neighbours in place
+        and pushes it on a trail (undo log). Every branch remembers the trail length it starts from, and
+        backtracking to it only undoes the removals made since, in reverse order.
+
         Args:
             G: graph to perform the search on
             timer: object to keep track of the time spent by the algorithm
             trace: object to keep track of the best solutions found by the algorithm at each iteration
-            
+
         Returns:
             quality: quality of the best solution found
             solution: best solution found as list of nodes
         """
-        
+
         self.G = G
         self.timer = timer
         self.trace = trace
-        
-        #initialize final output and trace intermediates
+
+        #initialize final output
         quality = None
-        quality1 = None
         solution = []
-        solution1 = []
-        
-        
-        #initializing parameters
-        OptVC = []
-        CurVC = []
-        Frontier = []
-        neighbor = []
-        
-        #initialize UB
-        #appr=Approx()
-        #UpperBound, solution_appr = appr.get_vertex_cover(self.G, self.timer, self.trace)
-        #UpperBound += 1
-        #initialize new graph to be divided in subproblems
-        UpperBound = G.v
-        CurG = deepcopy(G)
-        v = find_maxdeg(CurG)
-        
-        #The frontier set begins with the vertex with the highest degree
-        #0 and 1 indicates whether the node is in the vertex cover
-        Frontier.append((v[0], 0, (-1, -1)))
-        Frontier.append((v[0], 1, (-1, -1)))
-        
-        while timer.cutoff() == False and Frontier != []:
-            #Produce node for exploration
-            (vi,state,parent)=Frontier.pop()
-            backtrack = False
-            if state == 0: #not included in VC
-                neighbor = CurG.get_neighbours(vi)
-                for node in list(neighbor):
-                    CurVC.append((node, 1)) 
-                    #all neighboring nodes must be included in VC
-                    #Nodes included in VC are removed from the current graph
-                    CurG.v -= 1
-                    CurG.e -= len(CurG.adj[node])
-                    for Neigh in CurG.adj[node]:
-                        CurG.adj[Neigh].remove(node)
-                        if len(CurG.adj[Neigh]) == 0:
-                            del CurG.adj[Neigh]
-                            CurG.v -= 1
-                    del CurG.adj[node]
-                    
-            elif state == 1:
-                CurG.v -= 1
-                CurG.e -= len(CurG.adj[vi])
-                for node1 in CurG.adj[vi]:
-                    CurG.adj[node1].remove(vi)
-                    if len(CurG.adj[node1]) == 0:
-                        del CurG.adj[node1]
-                        CurG.v -= 1
-                del CurG.adj[vi]
-            
-            CurVC.append((vi,state))
-            CurVC_size = VC_Size(CurVC)
-            
-            if CurG.e == 0: #vertex cover complete
-                if CurVC_size < UpperBound:#accepts result
-                    OptVC = CurVC.copy()
-                    UpperBound = CurVC_size  #update UB
-                    solution1 = []
-                    #trace record
-                    for i in range(len(OptVC))            :
-                        if OptVC[i][1] == 1:
-                            solution1.append(OptVC[i][0])
-                    # check solution quality and record trace
-                    if G.is_vertex_cover(solution1):
-                        quality1=G.get_solution_quality(solution1)
-                        self.trace.add_record(quality1)
-                backtrack = True
-            else:
-                # set lower bound by dividing number of edges with max degree node in the partial graph
-                CurLB = Lowerbound(CurG) + CurVC_size
-                
-                # UBq,UBsol=appr.get_vertex_cover(CurG,self.timer,self.trace)
-                # if UBq<UpperBound:
-                    # UpperBound=UBq
-                # self.CurG = CurG
-                
-                #print(f"LB:{CurLB}|UB:{UpperBound}")
-                
-                if CurLB<UpperBound: #continue explore
-                    vj = find_maxdeg(CurG)
-                    Frontier.append((vj[0],0,(vi,state)))
-                    Frontier.append((vj[0],1,(vi,state)))
-                else: #end this path and backtrack
-                    backtrack = True
-            
-            if backtrack == True:
-                if Frontier != []: #revert to parent node
-                    nextnode_parent = Frontier[-1][2]
-                    
-                    if nextnode_parent in CurVC:
-                        id = CurVC.index(nextnode_parent) +1
-                        while id < len(CurVC): #
-                            Renode,Restate = CurVC.pop()
-                            CurG.v += 1
-                            CurG.adj[Renode] = []
-                            VCnow = []
-                            for i in range(len(CurVC))            :
-                                if CurVC[i][1] == 1:
-                                    VCnow.append(CurVC[i][0])
-                            #print(f"{CurG.adj}")
-                            for edges in G.adj[Renode]:
-                                if edges not in VCnow:
-                                    if edges not in CurG.adj:
-                                        CurG.adj[edges] = [Renode]
-                                        CurG.v += 1
-                                    else:
-                                        CurG.adj[edges].append(Renode)
-                                    CurG.adj[Renode].append(edges)
-                            CurG.e += len(CurG.adj[Renode])
-                    elif nextnode_parent == (-1, -1):
-                        CurVC.clear()
-                        CurG = deepcopy(G)
-                    else: 
-                        print('error in backtracking step')
-                        
-        #output final quality and solution    
-        for i in range(len(OptVC))            :
-            if OptVC[i][1] == 1:
-                solution.append(OptVC[i][0])
+
+        #initialize the incumbent (best known cover) the search starts pruning with
+        self.incumbent = self.get_seed_cover()
+        self.injector = self.start_injection() if self.inject_algorithm is not None else None
+
+        if self.workers > 1:
+            OptVC = self.search_parallel()
+        else:
+            OptVC = self.search()
+
+        if self.injector is not None:
+            injected = self.stop_injection()
+            if G.is_vertex_cover(injected) and (OptVC == [] or len(injected) < len(OptVC)):
+                OptVC = injected
+
+        #output final quality and solution
+        solution = OptVC
         # check solution quality
         if G.is_vertex_cover(solution):
             quality=G.get_solution_quality(solution)
@@ -171,35 +97,319 @@ class BnB:
             total_edges=G.e
             print(f"Solution is not found in time with {edges_covered} edges covered in total {total_edges} edges.")
         return quality, solution
-        
-def find_maxdeg(G):
-    node_max = [-1, -1]
-    for node in G.adj.keys():
-       if len(G.adj[node]) > node_max[1]:
-           node_max[0] = node
-           node_max[1] = len(G.adj[node])
-    return node_max
-    
-    #Calculate lowerbound of partial graph with max degree node
-def Lowerbound(G):
-    LB= G.e / find_maxdeg(G)[1]
-    LB= ceil(LB)
-    return LB
-    #G_nx=nx.Graph()
-    #G_nx.add_nodes_from(G.adj)
-    #return len(nx.maximal_matching(G_nx))
-
-#round LB
-def ceil(d):
-    if d > int(d):
-        return int(d) + 1
-    else:
-        return int(d)
-
-#Count size of VC for LB    
-def VC_Size(VC):
-    vc_size = 0
-    for i in range(len(VC)):
-        if VC[i][1] == 1:
-            vc_size += 1;
-    return vc_size
+
+    def init_search(self, G: Graph, timer: Timer = None):
+        """
+        Initializes the state of the remaining graph to the whole graph.
+        Given the search timer, the lower bound build is limited to LB_BUILD_SHARE of the remaining time.
+        """
+        self.G = G
+        self.degree = np.diff(G.indptr)
+        self.removed = np.zeros(G.v + 1, dtype=bool)
+        self.edges_left = G.e
+        self.cover_size = 0
+        self.trail = []     #removed vertices as (node, in_cover), in removal order
+
+        build_timer = None
+        if timer is not None:
+            build_timer = Timer(max(timer.time_limit - timer.elapsed(), 0) * LB_BUILD_SHARE)
+            build_timer.start()
+        try:
+            self.bound = LOWER_BOUNDS[self.lower_bound](G, self.degree, self.removed, build_timer)
+        except TimeoutError:
+            print(f"Building the {self.lower_bound} lower bound exceeded its time share, falling back to the degree bound")
+            self.bound = Degree_Bound(G, self.degree, self.removed)
+
+    def search(self) -> List[int]:
+        """ Explores the search tree depth first on a single core, returns the best cover found """
+        self.init_search(self.G, self.timer)
+
+        #initialize UB
+        OptVC = self.incumbent
+        UpperBound = len(OptVC) if OptVC != [] else self.G.v
+
+        #The frontier set begins with the vertex with the highest degree
+        v = find_maxdeg(self.degree)
+        Frontier = [(v, 0, 0), (v, 1, 0)]
+
+        while self.timer.cutoff() == False and Frontier != []:
+            UpperBound = min(UpperBound, self.get_injected_bound())
+            if self.step(Frontier, UpperBound): #accepts result
+                OptVC = self.get_current_cover()
+                UpperBound = self.cover_size  #update UB
+                # check solution quality and record trace
+                if self.G.is_vertex_cover(OptVC):
+                    self.trace.add_record(self.G.get_solution_quality(OptVC))
+
+        return OptVC
+
+    def step(self, Frontier: list, UpperBound: int) -> bool:
+        """
+        Explores the last node of the frontier, pushing its children on the frontier unless it can be pruned.
+
+        Frontier items are (vertex, state, mark): state 0 and 1 indicate whether the vertex is in the vertex cover,
+        mark is the trail length of the parent node to backtrack to.
+
+        Returns:
+            True if the node completes a vertex cover smaller than UpperBound
+        """
+        #Produce node for exploration, backtracking to the state of its parent first
+        (vi, state, mark) = Frontier.pop()
+        self.undo(mark)
+
+        if state == 0: #not included in VC
+            #all neighboring nodes must be included in VC
+            for node in self.get_remaining_neighbours(vi).tolist():
+                self.remove_vertex(node, True)
+            self.remove_vertex(vi, False)
+        elif state == 1:
+            self.remove_vertex(vi, True)
+
+        if self.edges_left == 0: #vertex cover complete
+            return self.cover_size < UpperBound
+
+        # set lower bound on the cover of the partial graph (see lower_bounds.py)
+        CurLB = self.bound.get(self.edges_left) + self.cover_size
+
+        if CurLB < UpperBound: #continue explore
+            vj = find_maxdeg(self.degree)
+            mark = len(self.trail)
+            Frontier.append((vj, 0, mark))
+            Frontier.append((vj, 1, mark))
+        return False
+
+    def get_seed_cover(self) -> List[int]:
+        """ Returns the cover found by ub_algorithm within UB_TIME seconds, or an empty list if there is none """
+        if self.ub_algorithm is None:
+            return []
+
+        t_timer = Timer(max(min(UB_TIME, self.timer.time_limit - self.timer.elapsed()), 0))
+        t_trace = Trace(t_timer, self.G)
+        t_timer.start()
+        cover = list(self.ub_algorithm.get_vertex_cover(self.G, t_timer, t_trace)[1])
+
+        if not self.G.is_vertex_cover(cover):
+            return []
+        self.trace.add_record(self.G.get_solution_quality(cover))
+        print(f"Upper bound seeded by {type(self.ub_algorithm).__name__}: {len(cover)}")
+        return cover
+
+    def start_injection(self) -> "Incumbent_Trace":
+        """
+        Starts inject_algorithm on a background thread for the rest of the time limit.
+        It runs on its own copy of the graph, as the algorithms keep their state (solution, counters, cover cache) in it.
+        """
+        self.injector_graph = type(self.G).from_edges(self.G.v, self.G.edges)
+        self.injector_graph.set_cover_cache(self.inject_algorithm.COVER_CACHE)
+        self.injector_timer = Timer(self.timer.time_limit - self.timer.elapsed())
+        self.injected_best = None
+        injector = Incumbent_Trace()
+        self.injector_timer.start()
+        self.injector_thread = threading.Thread(target=self.run_injection, args=(injector,), daemon=True)
+        self.injector_thread.start()
+        return injector
+
+    def run_injection(self, injector: "Incumbent_Trace"):
+        """ Body of the background thread, keeps the final cover of inject_algorithm """
+        injector.solution = list(self.inject_algorithm.get_vertex_cover(self.injector_graph, self.injector_timer, injector)[1])
+
+    def stop_injection(self) -> List[int]:
+        """ Stops the background algorithm and returns the best cover it found """
+        self.injector_timer.stop()
+        self.injector_thread.join()
+        self.get_injected_bound()
+        return self.injector.solution
+
+    def get_injected_bound(self) -> int:
+        """
+        Returns the size of the best cover found so far by the background algorithm or by other processes (shared_bound).
+        Improvements of the background algorithm are recorded in the trace here, by the search thread.
+        """
+        bound = self.G.v
+        if self.injector is not None:
+            best = self.injector.get_best()
+            if best is not None:
+                if best != self.injected_best:
+                    self.injected_best = best
+                    self.trace.add_record(best)
+                bound = best
+        if self.shared_bound is not None:
+            bound = min(bound, self.shared_bound.value)
+        return bound
+
+    def get_current_cover(self) -> List[int]:
+        """ Returns the vertices put in the cover on the current path """
+        return [node for node, in_cover in self.trail if in_cover]
+
+    def search_parallel(self) -> List[int]:
+        """
+        Explores the search tree with a pool of worker processes (see bnb_worker), returns the best cover found.
+
+        The best cover size is shared by all workers for pruning, and every improvement found by any worker
+        is sent back to be recorded in the trace. The graph is passed to the workers through shared memory,
+        and workers still running WORKER_GRACE seconds past the deadline are terminated.
+        """
+        G = self.G
+        ctx = mp.get_context()
+        tasks = ctx.Queue()
+        results = ctx.Queue()
+        upper_bound = ctx.Value('i', len(self.incumbent) if self.incumbent != [] else G.v)
+        pending = ctx.Value('i', 0)     #tasks queued or being explored
+        queued = ctx.Value('i', 0)      #tasks waiting in the queue
+        idle = ctx.Value('i', 0)        #workers waiting for a task
+        deadline = time() + self.timer.time_limit - self.timer.elapsed()
+
+        #The root branches on the vertex with the highest degree
+        v = find_maxdeg(np.diff(G.indptr))
+        for state in (0, 1):
+            share_task(tasks, pending, queued, ([], v, state))
+
+        shm, spec = G.share()
+        workers = [ctx.Process(target=bnb_worker, args=(spec, self.lower_bound, deadline, tasks, results, upper_bound, pending, queued, idle))
+                   for _ in range(self.workers)]
+        OptVC = self.incumbent
+        try:
+            for worker in workers:
+                worker.start()
+
+            while True:
+                injected = self.get_injected_bound()
+                if injected < upper_bound.value:
+                    with upper_bound.get_lock():
+                        upper_bound.value = min(upper_bound.value, injected)
+                try:
+                    cover = results.get(timeout=0.05)
+                except Empty:
+                    if not any(worker.is_alive() for worker in workers) and results.empty():
+                        break
+                    if time() > deadline + WORKER_GRACE:
+                        break
+                    continue
+                if (OptVC == [] or len(cover) < len(OptVC)) and G.is_vertex_cover(cover):
+                    OptVC = cover
+                    self.trace.add_record(G.get_solution_quality(OptVC))
+
+        finally:
+            for worker in workers:
+                if worker.pid is None:
+                    continue
+                worker.join(timeout=max(deadline + WORKER_GRACE - time(), 0))
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+            shm.close()
+            shm.unlink()
+        return OptVC
+
+    def get_remaining_neighbours(self, node: int) -> np.ndarray:
+        """ Returns the neighbours of the node that are still in the remaining graph """
+        neighbours = self.G.get_neighbours(node)
+        return neighbours[~self.removed[neighbours]]
+
+    def remove_vertex(self, node: int, in_cover: bool):
+        """ Deletes the node and its edges from the remaining graph, logging it on the trail """
+        neighbours = self.get_remaining_neighbours(node)
+        self.degree[neighbours] -= 1
+        self.degree[node] = 0
+        self.removed[node] = True
+        self.edges_left -= len(neighbours)
+        self.cover_size += in_cover
+        self.trail.append((node, in_cover))
+        self.bound.remove(node)
+
+    def undo(self, mark: int):
+        """ Restores the vertices removed since the trail had the given length, last removed first """
+        while len(self.trail) > mark:
+            node, in_cover = self.trail.pop()
+            self.removed[node] = False
+            neighbours = self.get_remaining_neighbours(node)
+            self.degree[neighbours] += 1
+            self.degree[node] = len(neighbours)
+            self.edges_left += len(neighbours)
+            self.cover_size -= in_cover
+            self.bound.restore(node)
+
+
+class Incumbent_Trace:
+    """
+    Trace given to the background algorithm: keeps the best quality it reports in a lock-protected slot,
+    read by the search thread as an upper bound (see BnB.get_injected_bound), as the cover itself is only
+    returned once the algorithm ends.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.best = None
+        self.solution = []
+
+    def add_record(self, quality: int):
+        with self.lock:
+            if self.best is None or quality < self.best:
+                self.best = quality
+
+    def get_best(self):
+        with self.lock:
+            return self.best
+
+
+def share_task(tasks, pending, queued, task: tuple):
+    """ Puts a subtree (trail to its root, vertex and state to branch on) in the shared task queue """
+    with pending.get_lock():
+        pending.value += 1
+    with queued.get_lock():
+        queued.value += 1
+    tasks.put(task)
+
+
+def bnb_worker(spec: dict, lower_bound: str, deadline: float, tasks, results, upper_bound, pending, queued, idle):
+    """
+    Worker process of the parallel branch and bound.
+
+    Takes subtrees from the shared queue and explores them depth first like the serial search, pruning with the best
+    cover size found by any worker. While other workers are idle, it shares the shallowest node of its frontier,
+    which is the largest subtree it still has to explore.
+    """
+    timer = Timer(deadline - time())
+    timer.start()
+    bnb = BnB(lower_bound=lower_bound)
+    bnb.init_search(Graph.from_shared(spec), timer)
+
+    while not timer.cutoff():
+        with idle.get_lock():
+            idle.value += 1
+        try:
+            trail, vi, state = tasks.get(timeout=0.05)
+        except Empty:
+            if pending.value == 0:
+                break
+            continue
+        finally:
+            with idle.get_lock():
+                idle.value -= 1
+        with queued.get_lock():
+            queued.value -= 1
+
+        #rebuild the state of the root of the subtree by replaying its trail
+        bnb.undo(0)
+        for node, in_cover in trail:
+            bnb.remove_vertex(node, in_cover)
+        Frontier = [(vi, state, len(trail))]
+
+        while Frontier != [] and not timer.cutoff():
+            if bnb.step(Frontier, upper_bound.value):
+                with upper_bound.get_lock():
+                    if bnb.cover_size < upper_bound.value:
+                        upper_bound.value = bnb.cover_size
+                        results.put(bnb.get_current_cover())
+
+            if len(Frontier) > 1 and idle.value > queued.value:
+                vj, state, mark = Frontier.pop(0)
+                share_task(tasks, pending, queued, (bnb.trail[:mark], vj, state))
+
+        with pending.get_lock():
+            pending.value -= 1
+
+
+def find_maxdeg(degree: np.ndarray) -> int:
+    """ Returns the node with the highest degree in the remaining graph (smallest id on ties) """
+    return int(np.argmax(degree))
@@ -36,6 +36,7 @@ DEBUG=True
 
 class LS1:
     IS_DETERMINISTIC = False
+    COVER_CACHE = "lru"
 
     def __init__(self):
         """ Constructor for the LS1 class """
@@ -100,9 +101,9 @@ class LS1:
                 # print(f"ub:{self.G.get_upper_bound()}|lb:{self.G.get_lower_bound()}")
                 continue
 
-            # add a vertex if the solution is not a vertex cover
-            add_candidates=self.G.get_add_candidates()
-            choice=random.choices(add_candidates,self.get_add_probabilities(list(add_candidates)),k=1)[0]
+            # add a vertex if the solution is not a vertex cover, picking one endpoint of a random uncovered edge
+            add_candidates=self.G.sample_uncovered_edge()
+            choice=random.choices(add_candidates,self.get_add_probabilities(add_candidates),k=1)[0]
             self.G.add_vertex(choice)  
             # print(f"Current temperature: {self.temperature:.3f} | Current quality:{self.G.get_solution_quality_new()}", end="\r") if DEBUG else None
         
@@ -141,7 +142,7 @@ class LS1:
         # remove redundant nodes
         while True:
             for node in self.G.get_solution():
-                if len(self.G.get_changes(node))==0:
+                if self.G.get_loss(node)==0:
                     self.G.remove_vertex(node)
                     continue
             break
@@ -172,6 +173,8 @@ class LS1:
                 return profile[phase]
             else: 
                 continue
+        # past the end of the profile (the cutoff may be noticed a few iterations late)
+        return profile[phase]
 
 
         # ===== Useful info: =====
@@ -1,12 +1,24 @@
 """
 This file contains the logic for the Second Local Search algorithm.
+
+The population is stored as a boolean matrix with one row per individual and one column per node
+(column 0 is unused, as nodes start from 1), so that fitness, crossover and mutation are computed
+for the whole generation at once with NumPy.
+
+With more than one worker, the population is split into islands evolving in separate processes
+(island model): every MIGRATION_INTERVAL generations each island sends copies of its best
+individuals to the next island in a ring, where they replace the worst individuals.
 """
 
 import random
 import numpy as np
+from time import time
+from queue import Empty
+from multiprocessing import Manager
+from concurrent.futures import ProcessPoolExecutor, FIRST_EXCEPTION, wait
 from typing import Tuple, List
 
-from graph import Graph
+from graph import Graph, Bitset_Cover
 from utils import Timer, Trace
 from algos.Approx import Approx
 
@@ -29,14 +41,29 @@ class LOGNORMAL_PARAM:
 class NEAR_TRIVIAL_PARAM:
     LOWER_BOUNDARY = 0.95
 
+MIGRATION_INTERVAL = 20   # generations between two migrations, in island mode
+MIGRANTS = 5              # number of best individuals sent to the next island at each migration
+ISLAND_SEED_MODES = ("max_degree", "reduction", "random_restart", "matching")   # Approx modes seeding the islands in turn, in "approx" initialization
+RESTART_SEED_SHARE = 0.1  # share of the remaining time a random_restart seeding may take, as it restarts until the cutoff
+
 DEBUG = False
 
 class LS2:
     IS_DETERMINISTIC = False
+    COVER_CACHE = "off"   # the population coverage is computed in batch (see Graph.count_covered_edges_batch)
     
-    def __init__(self):
-        """ Constructor for the LS2 class """
+    def __init__(self, workers: int = 1, population_size: int = POPULATION_SIZE, approx_mode: str = "max_degree"):
+        """
+        Constructor for the LS2 class
+
+        :param workers: workers > 1 splits the population into that many islands evolved in parallel processes
+        :param population_size: number of individuals of the population
+        :param approx_mode: Approx mode of the cover seeding the population in "approx" initialization
+        """
         if self.IS_DETERMINISTIC == None: raise ValueError("IS_DETERMINISTIC must be set to True or False")
+        self.workers = workers
+        self.population_size = population_size
+        self.approx_mode = approx_mode
         
     def get_vertex_cover(self, G: Graph, timer: Timer, trace: Trace) -> Tuple[int, List[int]]:
         """
@@ -52,90 +79,170 @@ class LS2:
             solution: best solution found as list of nodes
         """
         
-        self.G = G
-        self.timer = timer
-        self.trace = trace
+        self.init_search(G, timer, trace)
         
-        self.quality = None
-        self.solution = None
-        
-        # Initiating recurring variables
-        self.mutating_nodes = int(self.G.v * MUTATION_RATE)
+        if self.workers > 1:
+            return self.evolve_islands()
         
         # Initiating population and evaluating its fitness
         print("\tInitiating population\n")
         population = self.init_population()
         population_fitness, total_fitness = self.get_population_fitness(population)
         
-        average_size = sum([len(individual) for individual in population]) / len(population)
-        print("init average size:", average_size) if DEBUG else None
+        print("init average size:", population.sum(axis=1).mean()) if DEBUG else None
         
         # Generation loop
         generation = 0
         while not timer.cutoff():
-            # Find mating probabilities
-            mating_probabilities = self.get_mating_probability(population_fitness, total_fitness)
-            
-            # Create next generation
-            population = self.make_next_generation(population, mating_probabilities)
-            
-            # Evaluate fitness of the new population
-            population_fitness, total_fitness = self.get_population_fitness(population)
-            
-            # Find the best individual in the population
-            self.update_best_solution(population, population_fitness)
+            population, population_fitness, total_fitness = self.next_generation(population, population_fitness, total_fitness)
             
             # Print progress
-            sizes = [len(individual) for individual in population]
-            average_size = sum(sizes) / len(population)
-            variance = sum([((x - average_size) ** 2) for x in sizes]) / len(sizes)
-            std = round(variance ** 0.5, 3)
-            print(f"\tGen: {generation:<4}  | Avg. Fit: {round(total_fitness/POPULATION_SIZE, 3):7.3f}\t | Avg. Size: {average_size:7.3f}\t | Std. Size: {std:5.3f}\t | Best Sol Quality: {self.quality}")
+            sizes = population.sum(axis=1)
+            average_size = sizes.mean()
+            std = round(sizes.std(), 3)
+            print(f"\tGen: {generation:<4}  | Avg. Fit: {round(total_fitness/self.population_size, 3):7.3f}\t | Avg. Size: {average_size:7.3f}\t | Std. Size: {std:5.3f}\t | Best Sol Quality: {self.quality}")
             
             generation += 1
             
         return self.quality, self.solution
     
     
-    def init_population(self) -> List[List[int]]:
-        """ Initiating population with of random vertex covers"""
+    def init_search(self, G: Graph, timer: Timer, trace: Trace):
+        """ Initiating the search state """
+        self.G = G
+        self.timer = timer
+        self.trace = trace
+        
+        self.quality = None
+        self.solution = None
+        
+        # Initiating recurring variables
+        self.mutating_nodes = int(self.G.v * MUTATION_RATE)
+    
+    
+    def next_generation(self, population: np.ndarray, population_fitness: np.ndarray, total_fitness: float) -> Tuple[np.ndarray, np.ndarray, float]:
+        """ Breeds the next generation, evaluates it and updates the best solution found so far """
+        # Find mating probabilities
+        mating_probabilities = self.get_mating_probability(population_fitness, total_fitness)
+        
+        # Create next generation
+        population = self.make_next_generation(population, mating_probabilities)
+        
+        # Evaluate fitness of the new population
+        population_fitness, total_fitness = self.get_population_fitness(population)
+        
+        # Find the best individual in the population
+        self.update_best_solution(population, population_fitness)
+        
+        return population, population_fitness, total_fitness
+    
+    
+    def evolve_islands(self) -> Tuple[int, List[int]]:
+        """
+        Island model: splits the population into one island per worker process (see evolve_island), each seeded
+        by a different Approx mode, and evolves them until the time limit, recording the best solution found
+        by any island in the trace.
+        The graph is passed to the workers through shared memory.
+        """
+        shm, spec = self.G.share()
+        deadline = time() + self.timer.time_limit - self.timer.elapsed()
+        seeds = np.random.randint(0, 2**31 - 1, self.workers).tolist()
+        
+        try:
+            with Manager() as manager, ProcessPoolExecutor(max_workers=self.workers) as executor:
+                inboxes = [manager.Queue() for _ in range(self.workers)]
+                results = manager.Queue()
+                island_size = max(self.population_size // self.workers, MIGRANTS)
+                islands = [executor.submit(evolve_island, spec, idx, seeds[idx], deadline, island_size,
+                                           inboxes[idx], inboxes[(idx + 1) % self.workers], results)
+                           for idx in range(self.workers)]
+                
+                print(f"\tEvolving {self.workers} islands\n")
+                pending = islands
+                while pending:
+                    _, pending = wait(pending, timeout=0.1, return_when=FIRST_EXCEPTION)
+                    self.collect_island_results(results)
+                
+                generations = [island.result() for island in islands]
+                self.collect_island_results(results)
+                print(f"\tGenerations per island: {generations}")
+        finally:
+            shm.close()
+            shm.unlink()
+            
+        return self.quality, self.solution
+    
+    
+    def collect_island_results(self, results):
+        """ Records the solutions sent by the islands that improve on the best one found so far """
+        while True:
+            try:
+                island, generation, solution = results.get_nowait()
+            except Empty:
+                return
+            if (self.quality == None or len(solution) < self.quality) and self.G.is_vertex_cover(solution):
+                self.quality = self.G.get_solution_quality(solution)
+                self.solution = solution.tolist()
+                self.trace.add_record(self.quality)
+                print(f"\tIsland: {island:<3} | Gen: {generation:<4}  | Best Sol Quality: {self.quality}")
+    
+    
+    def receive_migrants(self, population: np.ndarray, population_fitness: np.ndarray, inbox) -> Tuple[np.ndarray, np.ndarray, float]:
+        """ Replaces the worst individuals of the population with the migrants waiting in the inbox """
+        migrants = []
+        while True:
+            try:
+                migrants.append(inbox.get_nowait())
+            except Empty:
+                break
+        if not migrants:
+            return population, population_fitness, population_fitness.sum()
+        
+        migrants = np.stack([migrant.to_mask() for batch in migrants for migrant in batch])[:len(population)]
+        worst = np.argsort(population_fitness)[:len(migrants)]
+        population[worst] = migrants
+        return (population, *self.get_population_fitness(population))
+    
+    
+    def init_population(self) -> np.ndarray:
+        """ Initiating population with of random vertex covers, as a population_size x (|V| + 1) boolean matrix """
         
-        population = []
-        all_nodes = self.G.all_nodes
+        population = np.zeros((self.population_size, self.G.v + 1), dtype=bool)
         
         if INITIALIZATION_MODE == "uniform":
-            get_number_of_nodes = lambda: random.randint(1, self.G.v)
+            counts = np.random.randint(1, self.G.v + 1, self.population_size)
             
         elif INITIALIZATION_MODE == "normal":
-            get_number_of_nodes = lambda: int(np.random.normal(self.G.v/2, self.G.v/4))
+            counts = np.random.normal(self.G.v/2, self.G.v/4, self.population_size).astype(int)
             
         elif INITIALIZATION_MODE == "lognorm":
-            get_number_of_nodes = self.get_lognormal_vertexes_count
+            counts = np.array([self.get_lognormal_vertexes_count() for i in range(self.population_size)])
             
         elif INITIALIZATION_MODE == "near_trivial":
-            get_number_of_nodes = lambda: random.randint(int(self.G.v-self.G.v*(1-NEAR_TRIVIAL_PARAM.LOWER_BOUNDARY)), self.G.v)
+            counts = np.random.randint(int(self.G.v-self.G.v*(1-NEAR_TRIVIAL_PARAM.LOWER_BOUNDARY)), self.G.v + 1, self.population_size)
             
         elif INITIALIZATION_MODE == "approx":
             
-            appr = Approx()
-            t_timer = Timer(self.timer.time_limit)
+            appr = Approx(self.approx_mode)
+            seed_time = self.timer.time_limit - self.timer.elapsed()
+            t_timer = Timer(seed_time * RESTART_SEED_SHARE if self.approx_mode == "random_restart" else seed_time)
             t_trace = Trace(t_timer, self.G)
             t_timer.start()
             
             vertex_cover = appr.get_vertex_cover(self.G, t_timer, t_trace)[1]
             
-            return [vertex_cover for i in range(POPULATION_SIZE)]
+            population[:, vertex_cover] = True
+            return population
             
         else:
             raise ValueError("Invalid initialization mode")
             
-        for i in range(POPULATION_SIZE):
-            # Create a random vertex cover of size ranging from 1 to G.v, with the given distribution mode
-            number_of_vertexes = get_number_of_nodes()
-
-            individual = random.sample(all_nodes, number_of_vertexes)  
-            print(number_of_vertexes, len(individual)) if DEBUG else None
-            population.append(individual)
+        # Create random vertex covers of size ranging from 1 to G.v, with the given distribution mode
+        counts = np.clip(counts, 0, self.G.v)
+        print(counts) if DEBUG else None
+        candidates = np.ones_like(population)
+        candidates[:, 0] = False
+        population[self.choose_random_nodes(candidates, counts)] = True
             
         return population
     
@@ -163,158 +270,182 @@ class LS2:
         return random_vertex_count
 
 
-    def get_fitness(self, individual: List[int]) -> List[int]:
-        """ Evaluating fitness of the individual (this is the our scoring function) """
-        if len(individual) == 0: 
-            return 0
+    def choose_random_nodes(self, candidates: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Picks counts[i] distinct random nodes among the True entries of row i of candidates (or all of them if there are fewer)
+        
+        Returns:
+            rows, nodes: indices of the picked entries, to be used as population[rows, nodes]
+        """
+        k = min(int(counts.max(initial=0)), candidates.shape[1] - 1)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        
+        # the k smallest random keys of a row, in order, are a random sample of its candidates
+        keys = np.where(candidates, np.random.random(candidates.shape), 2.0)
+        chosen = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        chosen_keys = np.take_along_axis(keys, chosen, axis=1)
+        order = np.argsort(chosen_keys, axis=1)
+        chosen = np.take_along_axis(chosen, order, axis=1)
+        chosen_keys = np.take_along_axis(chosen_keys, order, axis=1)
+        
+        keep = (np.arange(k) < counts[:, None]) & (chosen_keys < 2.0)
+        return np.nonzero(keep)[0], chosen[keep]
+
+
+    def get_population_fitness(self, population: np.ndarray) -> Tuple[np.ndarray, float]:
+        """ Evaluating fitness of every individual of the population (this is the our scoring function) """
+        sizes = population.sum(axis=1)
+        covered_edges, is_cover = self.G.count_covered_edges_batch(population)
         
         if FITNESS_MODE == "size_penalty":
-            covered_edges = self.G.count_covered_edges(individual) 
-            
-            denominator = self.G.e - covered_edges + len(individual) * SIZE_PENALTY_MULTIPLIER
-            if denominator == 0:
-                denominator = 0.001
-            
-            return (self.G.e / denominator) #/ len(individual)
+            denominator = self.G.e - covered_edges + sizes * SIZE_PENALTY_MULTIPLIER
+            denominator = np.where(denominator == 0, 0.001, denominator)
+            fitness = self.G.e / denominator #/ sizes
         
         elif FITNESS_MODE == "covered_edges_focused":
-            return (covered_edges * 10 - len(individual))
+            fitness = (covered_edges * 10 - sizes).astype(float)
         
         elif FITNESS_MODE == "minimizing_size_inverse":
             """ Minimizing size with fitness ratio and weeding out not complete solutions """
-            covered_edges = self.G.count_covered_edges(individual) 
-            if not self.G.is_vertex_cover(individual):
-                return 0.001
-            return self.G.v/len(individual)
+            fitness = np.where(is_cover, self.G.v / np.maximum(sizes, 1), 0.001)
         
         elif FITNESS_MODE == "minimizing_size_sub":
             """ Minimizing size with size difference and weeding out not complete solutions """
-            covered_edges = self.G.count_covered_edges(individual) 
-            if not self.G.is_vertex_cover(individual):
-                return 0.001
-            return self.G.v - len(individual)
+            fitness = np.where(is_cover, self.G.v - sizes, 0.001)
         
         else:
             raise ValueError("Invalid fitness mode")
-
+        
+        fitness = np.where(sizes == 0, 0, fitness)
+        self.is_cover = is_cover
+        return fitness, fitness.sum()
     
-    def get_population_fitness(self, population: List[List[int]]) -> Tuple[List[int], float]:
-        """ Evaluating fitness of the population """
-        total_fitness = 0
-        population_fitness = []
-        for individual in population:
-            fitness = self.get_fitness(individual)
-            population_fitness.append(fitness)
-            total_fitness += fitness
-        return population_fitness, total_fitness
     
+    def get_mating_probability(self, population_fitness: np.ndarray, total_fitness: float) -> np.ndarray:
+        """ Creates an array of weights corresponding to each individual's probability to mate based on its fitness """
+        return population_fitness / total_fitness
     
-    def get_mating_probability(self, population_fitness: List[int], total_fitness: int) -> List[float]:
-        """ Creates a list of weights corresponding to each individual's probability to mate based on its fitness """
-        probabilities = []
-        for fitness in population_fitness:
-            probabilities.append(fitness/total_fitness)
-            
-        return probabilities
     
-    
-    def make_next_generation(self, current_population: List[List[int]], mating_probabilities: List[float]) -> List[List[int]]:
+    def make_next_generation(self, current_population: np.ndarray, mating_probabilities: np.ndarray) -> np.ndarray:
         """ Creates the next generation of individuals """
-        next_gen = []
+        # Selecting two parents for every child (roulette wheel)
+        parents = np.random.choice(len(current_population), size=(self.population_size, 2), p=mating_probabilities)
         
-        while len(next_gen) < POPULATION_SIZE:
-            # Selecting two parents
-            parents = random.choices(current_population, weights=mating_probabilities, k=2)
-            
-            print("parent 1 size:", len(parents[0]), "parent 2 size:", len(parents[1])) if DEBUG else None
-            
-            # Creating a child by crossing over the parents
-            child = self.crossover(parents[0], parents[1])
-            
-            print("cross child size:", len(child)) if DEBUG else None
-            
-            # Mutating the child
-            child = self.mutate(child)
-            
-            print("mut child size:", len(child), "\n") if DEBUG else None
-            
-            next_gen.append(child)
-            
-            
-        return next_gen
+        # Creating the children by crossing over the parents
+        children = self.crossover(current_population[parents[:, 0]], current_population[parents[:, 1]])
+        
+        print("cross children avg. size:", children.sum(axis=1).mean()) if DEBUG else None
+        
+        # Mutating the children
+        children = self.mutate(children)
+        
+        print("mut children avg. size:", children.sum(axis=1).mean(), "\n") if DEBUG else None
+        
+        return children
     
     
-    def crossover(self, parent1: List[int], parent2: List[int]) -> List[int]:
-        """ Crossover between two parents to create a next generation's individual """
+    def crossover(self, parents1: np.ndarray, parents2: np.ndarray) -> np.ndarray:
+        """ Crossover between pairs of parents to create the next generation's individuals """
         
-        shared_nodes = set(parent1).intersection(set(parent2))
-        not_shared_nodes = set(parent1).symmetric_difference(set(parent2))
+        shared_nodes = parents1 & parents2
         
         if CROSSOVER_MODE == "add_not_shared":
-            
-            for node in list(not_shared_nodes):
-                if random.random() < CROSSOVER_RATE:
-                    shared_nodes.add(node)
-                    
-            return list(shared_nodes)
+            not_shared_nodes = parents1 ^ parents2
+            return shared_nodes | (not_shared_nodes & (np.random.random(shared_nodes.shape) < CROSSOVER_RATE))
         
         elif CROSSOVER_MODE == "remove_not_shared":
-            return list(shared_nodes)
+            return shared_nodes
         
         else:
             raise ValueError("Invalid crossover mode")
     
     
-    def mutate(self, individual: List[int]) -> List[int]:
-        """ Mutating the individual adding and/or removing nodes """  
+    def mutate(self, population: np.ndarray) -> np.ndarray:
+        """ Mutating the individuals adding and/or removing nodes """  
+        
+        # number of times in a row each individual passes a MUTATION_RATE check
+        get_repeats = lambda: np.random.geometric(1 - MUTATION_RATE, len(population)) - 1
         
         if MUTATION_MODE == "batch":
-            changing_nodes = random.sample(self.G.all_nodes, self.mutating_nodes)
-            for node in changing_nodes:
-                if node in individual:
-                    individual.remove(node)
-                else:
-                    individual.append(node)
+            all_nodes = np.ones_like(population)
+            all_nodes[:, 0] = False
+            changing_nodes = self.choose_random_nodes(all_nodes, np.full(len(population), self.mutating_nodes))
+            population[changing_nodes] = ~population[changing_nodes]
                     
         elif MUTATION_MODE == "switch":                
-            while random.random() < MUTATION_RATE:
-                if len(individual) == 0: break
-                active_node = random.choice(individual)
-                individual.remove(active_node)
-                
-            while random.random() < MUTATION_RATE:
-                inactive_nodes = list( set(self.G.all_nodes).difference(set(individual)) )
-                if len(inactive_nodes) == 0: break
-                inactive_node = random.choice(inactive_nodes)
-                individual.append(inactive_node)
+            population[self.choose_random_nodes(population, get_repeats())] = False
+            
+            inactive_nodes = ~population
+            inactive_nodes[:, 0] = False
+            population[self.choose_random_nodes(inactive_nodes, get_repeats())] = True
                 
         elif MUTATION_MODE == "decrease_size":
-            while random.random() < MUTATION_RATE:
-                if len(individual) <= 1: break
-                active_node = random.choice(individual)
-                individual.remove(active_node)
+            # at least one node is kept in every individual
+            removals = np.minimum(get_repeats(), np.maximum(population.sum(axis=1) - 1, 0))
+            population[self.choose_random_nodes(population, removals)] = False
                     
         else:
             raise ValueError("Invalid mutation mode")
                 
-        return individual
+        return population
     
     
-    def update_best_solution(self, population: List[List[int]], population_fitness: List[int]) -> Tuple[int, List[int]]:
+    def update_best_solution(self, population: np.ndarray, population_fitness: np.ndarray):
         """ Updates the best solution found so far """
         # Doing argmax on the population fitness
-        best_individual = population[population_fitness.index(max(population_fitness))]
+        best = int(np.argmax(population_fitness))
         
-        # Continue only if best_individual is actually a vertex cover
-        if not self.G.is_vertex_cover(best_individual):
+        # Continue only if best individual is actually a vertex cover
+        if not self.is_cover[best]:
             return
         
+        best_individual = np.flatnonzero(population[best]).tolist()
         current_quality = self.G.get_solution_quality(best_individual)
 
         # Updating the best solution found so far
         if self.quality == None or current_quality < self.quality:
+            if not self.G.is_vertex_cover(best_individual):
+                return
             self.quality = current_quality
             self.solution = best_individual
             self.trace.add_record(self.quality)
+
+
+def evolve_island(spec: dict, index: int, seed: int, deadline: float, population_size: int, inbox, outbox, results) -> int:
+    """
+    Worker process of the island model (island number index): evolves its own population of population_size individuals,
+    seeded by the index-th of ISLAND_SEED_MODES (in turn) in "approx" initialization, until the deadline, sending every
+    improvement of its best solution to results and exchanging migrants through inbox and outbox.
+    
+    Returns:
+        number of generations evolved
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    
+    G = Graph.from_shared(spec)
+    timer = Timer(deadline - time())
+    timer.start()
+    
+    island = LS2(population_size=population_size, approx_mode=ISLAND_SEED_MODES[index % len(ISLAND_SEED_MODES)])
+    island.init_search(G, timer, Trace(timer, G))
+    population = island.init_population()
+    population_fitness, total_fitness = island.get_population_fitness(population)
+    
+    generation = 0
+    quality = None
+    while not timer.cutoff():
+        population, population_fitness, total_fitness = island.next_generation(population, population_fitness, total_fitness)
+        generation += 1
         
-    
\ No newline at end of file
+        if island.quality != quality:
+            quality = island.quality
+            results.put((index, generation, Bitset_Cover(G.v, island.solution)))
+        
+        if generation % MIGRATION_INTERVAL == 0:
+            # individuals travel between processes packed as bitsets, 1 bit per node instead of 1 byte
+            outbox.put([Bitset_Cover.from_mask(individual) for individual in population[np.argsort(-population_fitness)[:MIGRANTS]]])
+            population, population_fitness, total_fitness = island.receive_migrants(population, population_fitness, inbox)
+    
+    return generation
@@ -0,0 +1,186 @@
+"""
+This file contains the logic for the NuMVC local search algorithm.
+
+NuMVC (Cai et al., 2013) keeps a candidate cover and, once it covers the graph, shrinks it by one vertex
+and tries to repair it through two-stage exchanges (remove a vertex, then add an endpoint of an uncovered edge).
+Moves are guided by edge weights that grow on uncovered edges, with configuration checking to avoid cycling.
+Removals pick the best of a few sampled vertices (as in FastVC) so that each step costs O(degree).
+"""
+
+import random
+import numpy as np
+from typing import Tuple, List
+
+from vertex_cover import Vertex_Cover, Index_Pool
+from utils import Timer, Trace
+from algos.Approx import Approx
+
+BMS_SAMPLES = 50            # number of vertices sampled from the cover when choosing one to remove
+WEIGHT_THRESHOLD = 0.5      # forget edge weights when their average exceeds WEIGHT_THRESHOLD * |V|
+FORGET_RATE = 0.3           # edge weights are scaled down by this factor when forgetting
+
+DEBUG = True
+
+
+class NuMVC:
+    IS_DETERMINISTIC = False
+    COVER_CACHE = "lru"
+
+    def __init__(self):
+        """ Constructor for the NuMVC class """
+        if self.IS_DETERMINISTIC == None:
+            raise ValueError("IS_DETERMINISTIC must be set to True or False")
+
+    def get_vertex_cover(self, G: Vertex_Cover, timer: Timer, trace: Trace) -> Tuple[int, List[int]]:
+        """
+        NuMVC local search algorithm implementation.
+
+        Args:
+            G: graph to perform the search on
+            timer: object to keep track of the time spent by the algorithm
+            trace: object to keep track of the best solutions found by the algorithm at each iteration
+
+        Returns:
+            quality: quality of the best solution found
+            solution: best solution found as list of nodes
+        """
+
+        self.G = G
+        self.timer = timer
+        self.trace = trace
+
+        # Initialize a vertex cover and the search state
+        self.init_cover()
+        self.init_weights()
+
+        solution = self.G.get_solution()
+        quality = self.G.get_solution_quality_new()
+        self.trace.add_record(quality)
+
+        step = 0
+        while not timer.cutoff():
+
+            # shrink the cover by one vertex every time it covers the graph
+            if self.G.is_vertex_cover_new():
+                if self.G.get_solution_quality_new() < quality:
+                    solution = self.G.get_solution()
+                    quality = self.G.get_solution_quality_new()
+                    self.trace.add_record(quality)
+                    print(f"Step: {step} | Current quality: {quality}", end="\r") if DEBUG else None
+                if len(self.cover) <= 1:
+                    break
+                scores = np.where(self.G.in_solution, self.dscore, -np.inf)
+                self.remove_vertex(int(np.argmax(scores)), step)
+                continue
+
+            # two-stage exchange: remove a vertex from the cover, then cover a random uncovered edge
+            self.remove_vertex(self.choose_remove_vertex(), step)
+            self.conf_change[self.removed] = False
+
+            self.add_vertex(self.choose_add_vertex(), step)
+
+            self.increase_weights()
+            step += 1
+
+        # check solution
+        if G.is_vertex_cover(solution):
+            quality = G.get_solution_quality(solution)
+            print(f"Solution is found with quality of {quality}.")
+
+        else:
+            edges_covered = G.count_covered_edges(solution)
+            total_edges = G.e
+            print(f"Solution is not found in time with {edges_covered} edges covered in total {total_edges} edges.")
+
+        return quality, solution
+
+    def init_cover(self):
+        """ Initiating a vertex cover with Approx and removing redundant nodes """
+        appr = Approx()
+        _, solution = appr.get_vertex_cover(self.G, self.timer, self.trace)
+        self.G.set_solution(solution)
+
+        for node in self.G.get_solution():
+            if self.G.get_loss(node) == 0:
+                self.G.remove_vertex(node)
+
+        self.cover = Index_Pool(self.G.v + 1, self.G.get_solution())
+
+    def init_weights(self):
+        """ Initiating unit edge weights, the scores, configuration checking and age of every vertex """
+        self.weights = np.ones(len(self.G.edges), dtype=np.int64)
+        self.total_weight = len(self.G.edges)
+        self.weight_threshold = max(WEIGHT_THRESHOLD * self.G.v, 2)
+        self.conf_change = np.ones(self.G.v + 1, dtype=bool)
+        self.time_stamp = np.zeros(self.G.v + 1, dtype=np.int64)
+        self.removed = None
+        self.update_dscores()
+
+    def update_dscores(self):
+        """
+        Recomputes the weighted score of every vertex:
+        - for a vertex outside the cover, the weight of the uncovered edges it would cover
+        - for a vertex in the cover, minus the weight of the edges only it covers
+        """
+        sources = np.repeat(np.arange(self.G.v + 1), np.diff(self.G.indptr))
+        in_solution = self.G.in_solution
+        slot_weights = self.weights[self.G.edge_ids]
+        neighbour_out = ~in_solution[self.G.indices]
+        contributions = np.where(neighbour_out, np.where(in_solution[sources], -slot_weights, slot_weights), 0)
+
+        cumulative = np.concatenate(([0], np.cumsum(contributions)))
+        self.dscore = cumulative[self.G.indptr[1:]] - cumulative[self.G.indptr[:-1]]
+
+    def add_vertex(self, node: int, step: int):
+        """ Adds the node to the cover and updates the scores of its neighbourhood in O(degree) """
+        neighbours = self.G.indices[self.G.indptr[node]:self.G.indptr[node + 1]]
+        weights = self.weights[self.G.get_node_edges(node)]
+        self.dscore[neighbours] += np.where(self.G.in_solution[neighbours], weights, -weights)
+        self.dscore[node] = -self.dscore[node]
+
+        self.G.add_vertex(node)
+        self.cover.add(node)
+        self.conf_change[neighbours] = True
+        self.time_stamp[node] = step
+
+    def remove_vertex(self, node: int, step: int):
+        """ Removes the node from the cover and updates the scores of its neighbourhood in O(degree) """
+        neighbours = self.G.indices[self.G.indptr[node]:self.G.indptr[node + 1]]
+        weights = self.weights[self.G.get_node_edges(node)]
+        self.dscore[neighbours] += np.where(self.G.in_solution[neighbours], -weights, weights)
+        self.dscore[node] = -self.dscore[node]
+
+        self.G.remove_vertex(node)
+        self.cover.remove(node)
+        self.conf_change[neighbours] = True
+        self.time_stamp[node] = step
+        self.removed = node
+
+    def choose_remove_vertex(self) -> int:
+        """ Best from multiple selection: the highest scoring of a few sampled cover vertices, breaking ties in favour of the oldest """
+        candidates = np.array(random.choices(self.cover.items, k=BMS_SAMPLES))
+        best = np.lexsort((self.time_stamp[candidates], -self.dscore[candidates]))[0]
+        return int(candidates[best])
+
+    def choose_add_vertex(self) -> int:
+        """ Chooses the endpoint of a random uncovered edge allowed by configuration checking with the highest score, breaking ties in favour of the oldest """
+        u, v = self.G.sample_uncovered_edge()
+        if not self.conf_change[u]:
+            return v
+        if not self.conf_change[v]:
+            return u
+        if self.dscore[u] != self.dscore[v]:
+            return u if self.dscore[u] > self.dscore[v] else v
+        return u if self.time_stamp[u] <= self.time_stamp[v] else v
+
+    def increase_weights(self):
+        """ Increases the weight of every uncovered edge by one, forgetting old weights once they grow too large """
+        uncovered = np.array(self.G.uncovered_edges.items, dtype=np.int64)
+        self.weights[uncovered] += 1
+        np.add.at(self.dscore, self.G.edges[uncovered].ravel(), 1)
+        self.total_weight += len(uncovered)
+
+        if self.total_weight >= self.weight_threshold * len(self.G.edges):
+            self.weights = np.floor(self.weights * FORGET_RATE).astype(np.int64)
+            self.total_weight = int(self.weights.sum())
+            self.update_dscores()
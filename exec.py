@@ -3,22 +3,34 @@ This file is the entry point for the project, it parses the arguments and
 runs the selected algorithm on the selected dataset.
 
 It can be executed following the required format:
-$ python -m exec -inst <filename> -alg [BnB|Approx|LS1|LS2] -time <cutoff in seconds> -seed <random seed>
+$ python -m exec -inst <filename> -alg [BnB|Approx|LS1|LS2|NuMVC] -time <cutoff in seconds> -seed <random seed> [-kernel] [-profile <mode>] [-store <database>] [-workers <processes>] [-ub <algorithm>] [-inject <algorithm>] [-portfolio <processes> [-portfolio_algs <algorithm> ...]]
 """
 
 import os
+import io
+import sys
+import signal
 import random
 import argparse
-import tracemalloc
+import contextlib
 import numpy as np
+import multiprocessing as mp
+from time import time
+from queue import Empty
+from typing import List, Tuple
 
 from graph import Graph
 from vertex_cover import Vertex_Cover
+from kernel import Kernel
+from profiler import Profiler, PROFILE_MODES
+from results import Result_Store
 from utils import Timer, Trace, save_solution, get_sys_info
-from algos.BnB import BnB
+from algos.BnB import BnB, LOWER_BOUND
+from lower_bounds import LOWER_BOUNDS
 from algos.Approx import Approx
 from algos.LS1 import LS1
 from algos.LS2 import LS2
+from algos.NuMVC import NuMVC
 
 
 OUTPUT_DIR = 'output'
@@ -28,11 +40,13 @@ ALGOS = {
     'Approx': Approx,
     'LS1': LS1,
     'LS2': LS2,
+    'NuMVC': NuMVC,
 }
+PORTFOLIO_GRACE = 5     # seconds a portfolio member may overrun the cutoff before being terminated
 
         
-def parse_args():
-    """ Parses the arguments passed to the script """
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """ Parses the arguments passed to the script (or the given list of arguments) """
     
     # Creating the parser
     parser = argparse.ArgumentParser(description='Run the selected algorithm on the selected dataset')
@@ -41,8 +55,17 @@ def parse_args():
     parser.add_argument('-alg', choices=ALGOS.keys(), help='algorithm to run', required=True)
     parser.add_argument('-time', type=int, help='cutoff time in seconds', required=True)
     parser.add_argument('-seed', type=int, help='random seed', required=True)
+    parser.add_argument('-kernel', action='store_true', help='reduce the graph with kernelization rules before running the algorithm')
+    parser.add_argument('-profile', choices=PROFILE_MODES, default='off', help='profiling mode, its results are saved in the stats JSON (default: off)')
+    parser.add_argument('-store', type=str, help='save the solution, trace and stats in this result store (see results.py) instead of files')
+    parser.add_argument('-workers', type=int, default=1, help='number of processes to run the algorithm on (BnB and LS2 only)')
+    parser.add_argument('-ub', choices=ALGOS.keys(), help='algorithm whose solution seeds the upper bound (BnB only)')
+    parser.add_argument('-inject', choices=ALGOS.keys(), help='algorithm run in the background to tighten the upper bound (BnB only)')
+    parser.add_argument('-lb', choices=LOWER_BOUNDS.keys(), help=f'lower bound used for pruning (BnB only, default: {LOWER_BOUND})')
+    parser.add_argument('-portfolio', type=int, default=1, help='number of processes running the algorithm at the same time with consecutive seeds')
+    parser.add_argument('-portfolio_algs', nargs='+', choices=ALGOS.keys(), help='algorithms assigned in turn to the portfolio processes (default: -alg)')
     
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def print_sys_info() -> None:
@@ -64,6 +87,65 @@ def print_graph_info(graph: Graph, instance_name: str) -> None:
     print(f"{'Graph name:':<20} {instance_name}")
     print(f"{'Number of vertices:':<20} {graph.v}")
     print(f"{'Number of edges:':<20} {graph.e}")
+    
+
+def print_kernel_info(kernel: Kernel, graph: Graph) -> None:
+    """ Printing kernel info """
+    print("\n========= Kernel =========")
+    print(f"{'Kernel vertices:':<20} {graph.v}")
+    print(f"{'Kernel edges:':<20} {graph.e}")
+    print(f"{'Vertices decided:':<20} {kernel.offset}")
+
+
+def get_algorithm(args: argparse.Namespace):
+    """ Instantiates the selected algorithm with the options given in the arguments """
+    options = {}
+    if args.workers > 1:
+        if args.alg not in ('BnB', 'LS2'):
+            raise ValueError(f"-workers is only supported by BnB and LS2, not {args.alg}")
+        options['workers'] = args.workers
+    if args.ub is not None:
+        options['ub_algorithm'] = ALGOS[args.ub]
+    if args.inject is not None:
+        options['inject_algorithm'] = ALGOS[args.inject]
+    if args.lb is not None:
+        options['lower_bound'] = args.lb
+    if (args.ub is not None or args.inject is not None or args.lb is not None) and args.alg != 'BnB':
+        raise ValueError(f"-ub, -inject and -lb are only supported by BnB, not {args.alg}")
+    return ALGOS[args.alg](**options)
+
+
+def get_portfolio_members(args: argparse.Namespace) -> List[argparse.Namespace]:
+    """ Returns the arguments of every process of a portfolio run: member i runs the i-th algorithm (in turn) with seed + i """
+    algs = args.portfolio_algs or [args.alg]
+    members = []
+    for idx in range(args.portfolio):
+        member = argparse.Namespace(**vars(args))
+        member.alg = algs[idx % len(algs)]
+        member.seed = args.seed + idx
+        member.portfolio = 1
+        members.append(member)
+    return members
+
+
+def get_algo_name(args: argparse.Namespace) -> str:
+    """ Returns the name of the algorithm of a run, or of the algorithms of a portfolio run joined by + """
+    if args.portfolio > 1:
+        return "+".join(dict.fromkeys(member.alg for member in get_portfolio_members(args)))
+    return args.alg
+
+
+def get_output_name(args: argparse.Namespace, algorithm) -> str:
+    """ Returns the name of the output files of a run, the seed is only part of it for non deterministic algorithms """
+    instance_name = os.path.splitext(os.path.basename(args.inst))[0]
+    if args.portfolio > 1:
+        return f"{instance_name}_{get_algo_name(args)}_{args.time}_{args.seed}_p{args.portfolio}"
+    
+    output_name = f"{instance_name}_{args.alg}_{args.time}"
+    if algorithm.IS_DETERMINISTIC == False:
+        output_name = f"{output_name}_{args.seed}"
+    return output_name
+
 
 def main():
     """ Main function that executes the selected algorithm on the selected dataset """
@@ -71,15 +153,31 @@ def main():
     # Parsing the arguments
     args = parse_args()
     
-    # Setting the random seed
-    random.seed(args.seed)    # NOTE: TODO: disabled seed for testing
-    np.random.seed(args.seed)
+    # Exiting normally when killed (e.g. by a scheduler), so that the streamed trace is flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
     
     # Loading the graph
     G = Vertex_Cover(args.inst)
     
+    run(args, G)
+
+
+def run(args: argparse.Namespace, G: Vertex_Cover) -> Tuple[int, List[int]]:
+    """
+    Runs the selected algorithm on the loaded graph and saves the solution, trace and stats files
+    
+    :param args: arguments of the run (see parse_args)
+    :param G: graph loaded from args.inst, in its initial state (see Graph.init_graph)
+    :return: quality and solution found
+    """
+    
+    # Setting the random seed
+    random.seed(args.seed)    # NOTE: TODO: disabled seed for testing
+    np.random.seed(args.seed)
+    
     # Getting the algorithm to run
-    algorithm = ALGOS[args.alg]()
+    algorithm = get_algorithm(args)
+    output_name = get_output_name(args, algorithm)
     
     print_sys_info()
     print_args(args)
@@ -88,25 +186,55 @@ def main():
     
     print_graph_info(G, instance_name) 
     
-    # Creating the timer and the trace
+    # Creating the timer
     timer = Timer(args.time)
-    trace = Trace(timer, G)
+    profiler = Profiler(args.profile)
+    profiler.start()
+    timer.start()
+    
+    # Reducing the graph to its kernel, the algorithm then runs on the kernel
+    full_G = G
+    if args.kernel:
+        kernel = Kernel(full_G)
+        G = kernel.get_graph(Vertex_Cover)
+        print_kernel_info(kernel, G)
+    
+    # Configuring the cache of covered edges counts for the algorithm
+    G.set_cover_cache(algorithm.COVER_CACHE)
+    
+    # Creating the trace, streamed to its file unless the run is saved in a result store
+    trace = Trace(timer, G, os.path.join(OUTPUT_DIR, output_name) if args.store is None else None)
+    if args.kernel:
+        trace.quality_offset = kernel.offset
     
     # Running the selected algorithm
     print(f"\n>> Running {args.alg} on {instance_name}...\n")
-    tracemalloc.start()
-    timer.start()
-    quality, solution = algorithm.get_vertex_cover(G, timer, trace)
+    if G.e == 0:
+        # nothing left to solve after the reductions
+        quality, solution = 0, []
+        trace.add_record(quality)
+    elif args.portfolio > 1:
+        quality, solution = run_portfolio(args, G, timer, trace)
+    else:
+        quality, solution = algorithm.get_vertex_cover(G, timer, trace)
+    
+    # Lifting the kernel solution back to the full graph
+    if args.kernel:
+        solution = kernel.lift(solution if solution is not None else [])
+        quality = full_G.get_solution_quality(solution) if full_G.is_vertex_cover(solution) else None
     time_elapsed = timer.elapsed()
     
-    memory_usage = tracemalloc.get_traced_memory()
-    trace.current_memory_usage = memory_usage[0]
-    trace.peak_memory_usage = memory_usage[1]
+    profile = profiler.stop()
+    trace.current_memory_usage = profile["current_memory_usage"]
+    trace.peak_memory_usage = profile["peak_memory_usage"]
+    trace.profile = profile
     
     print("\n\n")
     print_sys_info()
     print_args(args)
-    print_graph_info(G, instance_name) 
+    print_graph_info(full_G, instance_name) 
+    if args.kernel:
+        print_kernel_info(kernel, G)
     
     # Printing results
     print("\n========= Results =========")
@@ -114,21 +242,111 @@ def main():
     print(f"{'Time elapsed:':<20} {time_elapsed} s")
     print(f"{'Graph reads:':<20} {G._accesses_count}")
     print(f"{'Vertex cover checks:':<20} {G._vertex_cover_check_count}")
-    print(f"{'Current memory usage:':<20} {memory_usage[0]}")
-    print(f"{'Peak memory usage:':<20} {memory_usage[1]}")
+    print(f"{'Current memory usage:':<20} {trace.current_memory_usage}")
+    print(f"{'Peak memory usage:':<20} {trace.peak_memory_usage}")
     print(f"{'Solution found:':<20} {solution}")
     print("")
     
     # Creating output files    
-    output_name = f"{instance_name}_{args.alg}_{args.time}"
-    if algorithm.IS_DETERMINISTIC == False:
-        output_name = f"{output_name}_{args.seed}"
+    if args.store is not None:
+        store = Result_Store(args.store)
+        store.save_run(output_name, instance_name, get_algo_name(args), args.time, args.seed if algorithm.IS_DETERMINISTIC == False else None,
+                       quality, solution, trace.get_stats())
+        store.close()
+        print(f"Run {output_name} saved to {args.store}")
+    else:
+        trace.save(os.path.join(OUTPUT_DIR, f"{output_name}"))
+        trace.save_stats(os.path.join(STATS_DIR, f"{output_name}"))
+        save_solution(os.path.join(OUTPUT_DIR, f"{output_name}"), quality, solution)
+    profiler.dump(os.path.join(STATS_DIR, f"{output_name}"))
     
-    trace.save(os.path.join(OUTPUT_DIR, f"{output_name}"))
-    trace.save_stats(os.path.join(STATS_DIR, f"{output_name}"))
-    save_solution(os.path.join(OUTPUT_DIR, f"{output_name}"), quality, solution)
+    return quality, solution
     
+
+class Portfolio_Trace(Trace):
+    """
+    Trace of a portfolio member: only the improvements on the best cover size found by any member
+    are kept, and they are sent to the main process to be merged in its trace.
+    """
     
+    def __init__(self, timer: Timer, graph: Graph, best, results):
+        Trace.__init__(self, timer, graph)
+        self.best = best
+        self.results = results
+        
+    def add_record(self, quality: int):
+        with self.best.get_lock():
+            if quality >= self.best.value:
+                return
+            self.best.value = quality
+        Trace.add_record(self, quality)
+        self.results.put(("record", quality))
+
+
+def run_portfolio(args: argparse.Namespace, G: Vertex_Cover, timer: Timer, trace: Trace) -> Tuple[int, List[int]]:
+    """
+    Runs the portfolio members (see get_portfolio_members) in parallel processes on the same graph until the cutoff.
+    The members share the best cover size found so far (BnB members also prune with it), their improvements are
+    merged in the trace and the best cover found by any of them is returned.
+    """
+    members = get_portfolio_members(args)
+    ctx = mp.get_context()
+    best = ctx.Value('i', G.v + 1)
+    results = ctx.Queue()
+    shm, spec = G.share()
+    deadline = time() + timer.time_limit - timer.elapsed()
+    
+    processes = [ctx.Process(target=run_portfolio_member, args=(member, spec, deadline, best, results)) for member in members]
+    for process in processes:
+        process.start()
+    print(f"Portfolio: {', '.join(f'{member.alg} (seed {member.seed})' for member in members)}")
+    
+    quality, solution = None, None
+    try:
+        while True:
+            try:
+                message = results.get(timeout=0.1)
+            except Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    break
+                if time() > deadline + PORTFOLIO_GRACE:
+                    for process in processes:
+                        process.terminate()
+                continue
+            
+            if message[0] == "record":
+                trace.add_record(message[1])
+            elif message[0] == "solution" and message[1] is not None and G.is_vertex_cover(message[1]):
+                if quality is None or len(message[1]) < quality:
+                    solution = message[1]
+                    quality = G.get_solution_quality(solution)
+    finally:
+        for process in processes:
+            process.join()
+        shm.close()
+        shm.unlink()
+    
+    return quality, solution
+
+
+def run_portfolio_member(args: argparse.Namespace, spec: dict, deadline: float, best, results):
+    """ Process of a portfolio member: runs its algorithm on the shared graph and sends back its final cover """
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    
+    G = Vertex_Cover.from_shared(spec)
+    algorithm = get_algorithm(args)
+    if isinstance(algorithm, BnB):
+        algorithm.shared_bound = best.get_obj()
+    G.set_cover_cache(algorithm.COVER_CACHE)
+    
+    timer = Timer(deadline - time())
+    timer.start()
+    trace = Portfolio_Trace(timer, G, best, results)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, solution = algorithm.get_vertex_cover(G, timer, trace)
+    results.put(("solution", list(solution) if solution is not None else None))
+
 
 if __name__ == '__main__':
     main()
@@ -3,130 +3,642 @@ This file contains the logic needed to load a graph from a file.
 """
 
 import os
-from typing import List, Set
+import json
+import hashlib
+import logging
+import numpy as np
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+CHUNK_SIZE = 1 << 24    # number of bytes of the graph file parsed at a time
+
+# Binary sidecar cache of the CSR arrays, written next to the graph file
+CACHE_EXTENSION = ".csr"
+CACHE_MAGIC = b"MVC-CSR1"
+CACHE_HEADER_SIZE = 4096
+CACHE_ALIGNMENT = 64
+CACHED_ARRAYS = ("indptr", "indices", "edge_ids", "edges")
+
+# Cache of count_covered_edges results
+COVER_CACHE_POLICY = "lru"  # "lru" | "bounded" | "off"
+COVER_CACHE_SIZE = 1 << 16  # max number of covers remembered
+ZOBRIST_SEED = 0            # seed of the random keys of the nodes, independent from the algorithms' seed
+
+BATCH_CHUNK = 1 << 24       # max number of (cover, edge) pairs evaluated at once by count_covered_edges_batch
+
+# A cover is given either as a list (or any sized iterable) of nodes or as a Bitset_Cover
+Cover = Union[List[int], 'Bitset_Cover']
+
+
+def load_metis(path: str, chunk_size: int = CHUNK_SIZE) -> Tuple[int, int, np.ndarray, np.ndarray]:
+    """
+    Streams a METIS-style graph file into CSR arrays.
+
+    The file is read in chunks of whole lines, each chunk is tokenized in bulk by NumPy and copied
+    into buffers preallocated from the "v e" header, so memory stays proportional to the graph
+    rather than to the text. The header counts are checked against what is actually read.
+
+    :param path: path to the graph dataset
+    :param chunk_size: number of bytes to read at a time
+    :return: number of nodes, number of edges, indptr and indices arrays (see Graph)
+    """
+    with open(path, 'rb') as f:
+        header = f.readline().split()
+        if len(header) < 2:
+            raise ValueError(f"Invalid header in {path}, expected 'v e'")
+        v, e = int(header[0]), int(header[1])
+
+        # degrees[node + 1] holds the degree of node, so its cumulative sum is indptr
+        degrees = np.zeros(v + 2, dtype=np.int64)
+        indices = np.empty(2 * e, dtype=np.int32)
+        node, filled = 1, 0
+        remainder = b''
+
+        while True:
+            chunk = f.read(chunk_size)
+            data = remainder + chunk
+            if not chunk:
+                if not data:
+                    break
+                # last line without a trailing newline
+                data += b'\n'
+            cut = data.rfind(b'\n')
+            if cut == -1:
+                remainder = data
+                continue
+            lines, remainder = data[:cut + 1], data[cut + 1:]
+
+            # Node ids start from 1, so 0 is used as an end of line marker
+            tokens = np.fromstring(lines.replace(b'\n', b' 0 ').decode('ascii'), dtype=np.int64, sep=' ')
+            line_ends = np.flatnonzero(tokens == 0)
+            if len(line_ends) != lines.count(b'\n'):
+                raise ValueError(f"Malformed adjacency list in {path} around node {node}")
+            line_degrees = np.diff(line_ends, prepend=-1) - 1
+            neighbours = tokens[tokens != 0]
+
+            # Trailing blank lines after the last node are tolerated
+            if node + len(line_degrees) - 1 > v:
+                if line_degrees[max(v - node + 1, 0):].any():
+                    raise ValueError(f"{path} has more adjacency lists than the {v} nodes declared in its header")
+                line_degrees = line_degrees[:max(v - node + 1, 0)]
+            if filled + len(neighbours) > len(indices):
+                raise ValueError(f"{path} has more than the {e} edges declared in its header")
+            if len(neighbours) and (neighbours.min() < 1 or neighbours.max() > v):
+                raise ValueError(f"{path} references a node outside of 1..{v}")
+
+            degrees[node + 1:node + 1 + len(line_degrees)] = line_degrees
+            indices[filled:filled + len(neighbours)] = neighbours
+            node += len(line_degrees)
+            filled += len(neighbours)
+
+    if node - 1 < v:
+        raise ValueError(f"{path} declares {v} nodes in its header but only {node - 1} adjacency lists were read")
+    if filled != len(indices):
+        raise ValueError(f"{path} declares {e} edges in its header but {filled / 2:g} were read")
+
+    return v, e, np.cumsum(degrees), indices
+
+
+def get_file_hash(path: str) -> str:
+    """ Returns the SHA-1 digest of the file at the given path """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_csr_cache(path: str) -> Optional[Dict]:
+    """
+    Memory-maps the CSR arrays cached for the given graph file.
+
+    The cache is valid if the source file still has the size and modification time it had when the
+    cache was written, or failing that the same content hash (the modification time in the header is then
+    refreshed so that later loads do not hash the file again), and if the cache file holds all its arrays.
+
+    :param path: path to the graph dataset (not to the cache)
+    :return: dictionary with v, e and the cached arrays, None if there is no valid cache
+    """
+    cache_path = path + CACHE_EXTENSION
+    if not os.path.exists(cache_path):
+        return None
+
+    try:
+        with open(cache_path, 'rb') as f:
+            header = f.read(CACHE_HEADER_SIZE)
+        if not header.startswith(CACHE_MAGIC):
+            return None
+        meta = json.loads(header[len(CACHE_MAGIC):].rstrip(b'\0'))
+        cache_size = os.path.getsize(cache_path)
+    except (OSError, ValueError):
+        return None
+
+    source = os.stat(path)
+    if meta["size"] != source.st_size:
+        return None
+    if meta["mtime_ns"] != source.st_mtime_ns:
+        if meta["sha1"] != get_file_hash(path):
+            return None
+        meta["mtime_ns"] = source.st_mtime_ns
+        write_csr_cache_header(cache_path, meta)
+
+    cached = {"v": meta["v"], "e": meta["e"]}
+    for name, (dtype, shape, offset) in meta["arrays"].items():
+        # a truncated cache is rebuilt rather than failing the load
+        if offset + np.dtype(dtype).itemsize * int(np.prod(shape)) > cache_size:
+            return None
+        cached[name] = np.asarray(np.memmap(cache_path, dtype=dtype, mode='r', offset=offset, shape=tuple(shape)))
+    return cached
+
+
+def write_csr_cache_header(cache_path: str, meta: Dict):
+    """ Overwrites the fixed-size header of an existing cache in place, leaving its arrays untouched """
+    header = CACHE_MAGIC + json.dumps(meta).encode()
+    try:
+        with open(cache_path, 'r+b') as f:
+            f.write(header.ljust(CACHE_HEADER_SIZE, b'\0'))
+    except OSError as e:
+        logging.warning(f"Could not update graph cache {cache_path}: {e}")
+
+
+def save_csr_cache(path: str, v: int, e: int, arrays: Dict[str, np.ndarray]):
+    """
+    Writes the CSR arrays of the given graph file to its binary sidecar cache.
+
+    The arrays are laid out raw after a fixed-size JSON header so that they can be memory-mapped,
+    and the file is written under a temporary name and then atomically renamed so that concurrent
+    runs never see a partial cache.
+
+    :param path: path to the graph dataset (not to the cache)
+    :param v: number of nodes
+    :param e: number of edges
+    :param arrays: arrays to cache, by attribute name
+    """
+    cache_path = path + CACHE_EXTENSION
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    source = os.stat(path)
+
+    meta = {"v": v, "e": e, "size": source.st_size, "mtime_ns": source.st_mtime_ns,
+            "sha1": get_file_hash(path), "arrays": {}}
+    offset = CACHE_HEADER_SIZE
+    for name, array in arrays.items():
+        offset = -(-offset // CACHE_ALIGNMENT) * CACHE_ALIGNMENT
+        meta["arrays"][name] = (array.dtype.str, list(array.shape), offset)
+        offset += array.nbytes
+
+    header = CACHE_MAGIC + json.dumps(meta).encode()
+    if len(header) > CACHE_HEADER_SIZE:
+        raise ValueError("Graph cache header is too large")
+
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(header.ljust(CACHE_HEADER_SIZE, b'\0'))
+            for name, array in arrays.items():
+                f.seek(meta["arrays"][name][2])
+                f.write(np.ascontiguousarray(array).tobytes())
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logging.warning(f"Could not write graph cache {cache_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class Cover_Cache:
+    """
+    Size-bounded cache of the number of edges covered by a cover, keyed by (Zobrist hash, size) of the cover
+    (see Graph.get_cover_key) so that a key costs 8 bytes instead of a copy of the cover.
+
+    Policies:
+        - lru: evicts the least recently used cover when full
+        - bounded: evicts the oldest inserted cover when full
+        - off: never stores anything
+    """
+
+    POLICIES = ("lru", "bounded", "off")
+
+    def __init__(self, policy: str = COVER_CACHE_POLICY, max_size: int = COVER_CACHE_SIZE):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Invalid cover cache policy {policy}, expected one of {self.POLICIES}")
+        self.policy = policy
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.policy != "off" and self.max_size > 0
+
+    def get(self, key: Tuple[int, int]) -> Optional[int]:
+        """ Returns the cached value for the key, None on a miss """
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.policy == "lru":
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple[int, int], value: int):
+        """ Stores the value, evicting the oldest (bounded) or least recently used (lru) entry if full """
+        if not self.enabled:
+            return
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict:
+        """ Returns the configuration and counters of the cache, as saved in the stats JSON """
+        return {"policy": self.policy, "max_size": self.max_size, "size": len(self.entries),
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class Bitset_Cover:
+    """
+    Immutable set of the nodes 0..v (like a frozenset) packed one bit per node into 64-bit words, so a cover takes
+    v / 8 bytes and set algebra between two covers is a handful of word-wise operations. It can be passed anywhere
+    a list of nodes is accepted (iterating it yields the nodes in increasing order), and used as a dictionary key.
+
+    Attributes:
+        - v: int - largest node that can be stored
+        - words: np.ndarray - read-only little-endian uint64 words, node i is bit i % 64 of word i // 64
+    """
+
+    __slots__ = ("v", "words")
+
+    def __init__(self, v: int, nodes: Iterable[int] = ()):
+        """
+        Constructor for the Bitset_Cover class
+
+        :param v: number of nodes of the graph
+        :param nodes: nodes in the cover (Python or NumPy integers)
+        """
+        self.v = v
+        self.words = np.zeros((v + 64) // 64, dtype='<u8')
+        nodes = np.fromiter(nodes, dtype=np.int64)
+        if len(nodes):
+            np.bitwise_or.at(self.words, nodes >> 6, np.left_shift(np.uint64(1), (nodes & 63).astype(np.uint64)))
+        self.words.flags.writeable = False
+
+    @classmethod
+    def from_words(cls, v: int, words: np.ndarray) -> 'Bitset_Cover':
+        """ Wraps already packed words into a cover, without copying them """
+        cover = cls.__new__(cls)
+        cover.v, cover.words = v, words
+        cover.words.flags.writeable = False
+        return cover
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> 'Bitset_Cover':
+        """ Builds the cover of the nodes that are True in a boolean array indexed by node (such as an LS2 individual) """
+        words = np.zeros(len(mask) // 64 + 1, dtype='<u8')
+        packed = np.packbits(mask, bitorder='little')
+        words.view(np.uint8)[:len(packed)] = packed
+        return cls.from_words(len(mask) - 1, words)
+
+    def __reduce__(self):
+        return Bitset_Cover.from_words, (self.v, self.words.copy())
+
+    def to_mask(self) -> np.ndarray:
+        """ Returns the boolean array of length v + 1, indexed by node, that is True for the nodes in the cover """
+        return np.unpackbits(self.words.view(np.uint8), count=self.v + 1, bitorder='little').view(bool)
+
+    def get_nodes(self) -> np.ndarray:
+        """ Returns the nodes in the cover, in increasing order """
+        return np.flatnonzero(self.to_mask())
+
+    def tolist(self) -> List[int]:
+        return self.get_nodes().tolist()
+
+    def with_node(self, node: int) -> 'Bitset_Cover':
+        """ Returns a new cover with the node added """
+        node = int(node)
+        words = self.words.copy()
+        words[node >> 6] |= np.uint64(1 << (node & 63))
+        return Bitset_Cover.from_words(self.v, words)
+
+    def without_node(self, node: int) -> 'Bitset_Cover':
+        """ Returns a new cover with the node removed """
+        node = int(node)
+        words = self.words.copy()
+        words[node >> 6] &= np.uint64(~(1 << (node & 63)) & 0xFFFFFFFFFFFFFFFF)
+        return Bitset_Cover.from_words(self.v, words)
+
+    def __contains__(self, node: int) -> bool:
+        node = int(node)
+        return bool(int(self.words[node >> 6]) >> (node & 63) & 1)
+
+    def __len__(self) -> int:
+        """ Number of nodes in the cover (popcount of the words) """
+        return int(popcount(self.words).sum())
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __and__(self, other: 'Bitset_Cover') -> 'Bitset_Cover':
+        return self.combine(other, np.bitwise_and(self.words, other.words))
+
+    def __or__(self, other: 'Bitset_Cover') -> 'Bitset_Cover':
+        return self.combine(other, np.bitwise_or(self.words, other.words))
+
+    def __xor__(self, other: 'Bitset_Cover') -> 'Bitset_Cover':
+        return self.combine(other, np.bitwise_xor(self.words, other.words))
+
+    def __sub__(self, other: 'Bitset_Cover') -> 'Bitset_Cover':
+        return self.combine(other, np.bitwise_and(self.words, np.invert(other.words)))
+
+    def combine(self, other: 'Bitset_Cover', words: np.ndarray) -> 'Bitset_Cover':
+        """ Wraps the words computed from this cover and another one of the same graph into a new cover """
+        if other.v != self.v:
+            raise ValueError(f"Cannot combine covers of graphs with {self.v} and {other.v} nodes")
+        return Bitset_Cover.from_words(self.v, words)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Bitset_Cover) and self.v == other.v and np.array_equal(self.words, other.words)
+
+    def __hash__(self) -> int:
+        return hash(self.words.tobytes())
+
+    def __repr__(self) -> str:
+        return f"Bitset_Cover({self.v}, {self.tolist()})"
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """ Number of bits set in each uint64 word """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    return np.unpackbits(words.view(np.uint8)).reshape(len(words), 64).sum(axis=1)
+
 
 class Graph:
     """
-    The graph is represented through adjacency lists stored in dictionary where:
-    - keys are the nodes
-    - values are the lists of nodes that are adjacent to the key node
-    
+    The graph is represented in compressed sparse row (CSR) format where:
+    - nodes are the integers from 1 to v (slot 0 is unused and always empty)
+    - the neighbours of a node are indices[indptr[node]:indptr[node + 1]]
+    - each adjacency slot also stores the integer id of the edge it belongs to in edge_ids
+    The arrays are cached in a binary sidecar file (<graph file>.csr) and memory-mapped on later loads.
+
     Attributes:
         - v: int - number of nodes
         - e: int - number of edges
-        - adj: dict - adjacency lists representation of thr graph as described above
+        - indptr: np.ndarray - offsets of each node's neighbours in indices (length v + 2)
+        - indices: np.ndarray - concatenated neighbours of all nodes
+        - edge_ids: np.ndarray - edge id of every adjacency slot in indices
+        - edges: np.ndarray - endpoints of every edge, indexed by edge id (shape e x 2)
         - _accesses_count: int - number of accesses to the graph
     """
-    
-    def __init__(self, path: str):
+
+    def __init__(self, path: str, use_cache: bool = True):
         """
         Constructor for the Graph class
-        
+
         :param path: path to the graph dataset
+        :param use_cache: load the CSR arrays from the binary sidecar cache, writing it if missing or stale
         """
-        
-        self.adj = {}
-        self._accesses_count = 0
-        self._vertex_cover_check_count = 0
-        
+
         if not os.path.exists(path):
             raise FileNotFoundError(f"Graph file not found at {path}")
-        
-        # Loading graph from file
-        with open(path, 'r') as f:
-            lines = f.readlines()
-            
-        # Loading graph info (V, E)
-        self.v, self.e, _ = [int(x) for x in lines[0].split()]
-    
-        # Loading neighbours
-        current_node_idx = 1
-        for line in lines[1:]:
-            self.adj[current_node_idx] = [int(x) for x in line.split()]
-            
-            current_node_idx += 1
-        self.all_nodes = list(self.adj.keys())
-        
-        # Precomputing all edges
-        self.all_edges = set()
-        self.node_edges = dict()
-        for node in self.all_nodes:
-            self.node_edges[node] = set()
-
-        for node in self.all_nodes:
-            for neighbour in self.get_neighbours(node):
-                edge = frozenset([node, neighbour])
-                self.node_edges[node].add(edge)
-                self.node_edges[neighbour].add(edge)
-                self.all_edges.add(edge)
-                
+
+        cached = load_csr_cache(path) if use_cache else None
+        if cached is not None:
+            self.v, self.e = cached["v"], cached["e"]
+            for name in CACHED_ARRAYS:
+                setattr(self, name, cached[name])
+        else:
+            # Loading graph info (V, E) and neighbours
+            self.v, self.e, self.indptr, self.indices = load_metis(path)
+
+            # Precomputing all edges
+            self.build_edge_index()
+
+            if use_cache:
+                save_csr_cache(path, self.v, self.e, {name: getattr(self, name) for name in CACHED_ARRAYS})
+
+        self.init_graph()
+
+    @classmethod
+    def from_edges(cls, v: int, edges: np.ndarray) -> 'Graph':
+        """
+        Builds a graph (or an instance of a subclass) directly from its edges, without a dataset file
+
+        :param v: number of nodes, numbered from 1 to v
+        :param edges: endpoints of every edge (shape e x 2), each edge listed once
+        :return: the new graph
+        """
+        graph = cls.__new__(cls)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        sources = np.concatenate((edges[:, 0], edges[:, 1]))
+        targets = np.concatenate((edges[:, 1], edges[:, 0]))
+        order = np.lexsort((targets, sources))
+
+        graph.v, graph.e = v, len(edges)
+        graph.indptr = np.zeros(v + 2, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=v + 1), out=graph.indptr[1:])
+        graph.indices = targets[order].astype(np.int32)
+        graph.build_edge_index()
+        graph.init_graph()
+        return graph
+
+    def share(self) -> Tuple[shared_memory.SharedMemory, Dict]:
+        """
+        Copies the CSR arrays into a shared memory block, so that other processes can use the graph
+        read-only (see from_shared) without it being pickled for each of them.
+        The caller owns the block and must close and unlink it once the other processes are done.
+
+        :return: the shared memory block, and the picklable description of it to pass to from_shared
+        """
+        spec = {"v": self.v, "e": self.e, "arrays": {}}
+        offset = 0
+        for name in CACHED_ARRAYS:
+            array = getattr(self, name)
+            offset = -(-offset // CACHE_ALIGNMENT) * CACHE_ALIGNMENT
+            spec["arrays"][name] = (array.dtype.str, array.shape, offset)
+            offset += array.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, (dtype, shape, offset) in spec["arrays"].items():
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = getattr(self, name)
+        spec["name"] = shm.name
+        return shm, spec
+
+    @classmethod
+    def from_shared(cls, spec: Dict) -> 'Graph':
+        """
+        Builds a graph (or an instance of a subclass) on the CSR arrays shared by Graph.share, without copying them
+
+        :param spec: description of the shared memory block returned by Graph.share
+        :return: the new graph, its arrays are read-only views of the shared block
+        """
+        graph = cls.__new__(cls)
+        graph._shm = shared_memory.SharedMemory(name=spec["name"])
+        graph.v, graph.e = spec["v"], spec["e"]
+        for name, (dtype, shape, offset) in spec["arrays"].items():
+            array = np.ndarray(shape, dtype=dtype, buffer=graph._shm.buf, offset=offset)
+            array.flags.writeable = False
+            setattr(graph, name, array)
+        graph.init_graph()
+        return graph
+
+    def init_graph(self):
+        """ Initializes the node list, the counters and the caches once the CSR arrays are set """
+        self._adj = None
+        self._accesses_count = 0
+        self._vertex_cover_check_count = 0
+        self.all_nodes = list(range(1, self.v + 1))
+
         # Creating caches
-        self.count_covered_edges_cache = dict()
-                
-    def get_neighbours(self, node: int) -> List[int]:
+        self.zobrist_keys = None
+        self.set_cover_cache(COVER_CACHE_POLICY)
+
+    def set_cover_cache(self, policy: str, max_size: int = COVER_CACHE_SIZE):
+        """ Replaces the cache of count_covered_edges with an empty one with the given policy (see Cover_Cache) """
+        self.cover_cache = Cover_Cache(policy, max_size)
+
+    def get_cover_key(self, vertex_cover: Cover) -> Tuple[int, int]:
+        """
+        Returns the cache key of a cover: the XOR of a random 64-bit key per node (Zobrist hashing) and its size.
+        Adding or removing a node changes the hash by XORing its key, so it can also be maintained incrementally
+        (see Vertex_Cover.solution_key). Repeated nodes are only counted once.
+        """
+        nodes = np.unique(self.get_cover_nodes(vertex_cover))
+        return int(np.bitwise_xor.reduce(self.get_zobrist_keys()[nodes])), len(nodes)
+
+    def get_zobrist_keys(self) -> np.ndarray:
+        """ Returns the random 64-bit key of every node used by get_cover_key, drawn on first use """
+        if self.zobrist_keys is None:
+            rng = np.random.default_rng(ZOBRIST_SEED)
+            self.zobrist_keys = rng.integers(0, np.iinfo(np.uint64).max, self.v + 1, dtype=np.uint64, endpoint=True)
+        return self.zobrist_keys
+
+    def get_cover_nodes(self, vertex_cover: Cover) -> np.ndarray:
+        """ Returns the nodes of a cover given as a list of nodes or as a Bitset_Cover, as an array """
+        if isinstance(vertex_cover, Bitset_Cover):
+            return vertex_cover.get_nodes()
+        return np.fromiter(vertex_cover, dtype=np.int64, count=len(vertex_cover))
+
+    def get_cover_mask(self, vertex_cover: Cover) -> np.ndarray:
+        """ Returns a boolean array, indexed by node, that is True for the nodes of the given cover """
+        if isinstance(vertex_cover, Bitset_Cover):
+            return vertex_cover.to_mask()
+        in_cover = np.zeros(self.v + 1, dtype=bool)
+        in_cover[np.fromiter(vertex_cover, dtype=np.int64, count=len(vertex_cover))] = True
+        return in_cover
+
+    def build_edge_index(self):
+        """ Assigns an integer id to every undirected edge and records it for each adjacency slot """
+        sources = np.repeat(np.arange(self.v + 1, dtype=np.int64), np.diff(self.indptr))
+        targets = self.indices.astype(np.int64)
+        keys = np.minimum(sources, targets) * (self.v + 1) + np.maximum(sources, targets)
+
+        unique_keys, edge_ids = np.unique(keys, return_inverse=True)
+        self.edge_ids = edge_ids.astype(np.int32)
+        self.edges = np.empty((len(unique_keys), 2), dtype=np.int32)
+        self.edges[:, 0] = unique_keys // (self.v + 1)
+        self.edges[:, 1] = unique_keys % (self.v + 1)
+
+    @property
+    def adj(self) -> Dict[int, List[int]]:
+        """ Adjacency lists of the graph as a dictionary, materialized from the CSR arrays on first access """
+        if self._adj is None:
+            self._adj = {node: self.indices[self.indptr[node]:self.indptr[node + 1]].tolist() for node in self.all_nodes}
+        return self._adj
+
+    def get_neighbours(self, node: int) -> np.ndarray:
         """
-        Returns the list of neighbours of the given node
-        
+        Returns the neighbours of the given node
+
         :param node: node to get the neighbours of
-        :return: list of neighbours
+        :return: array of neighbours (a read-only view into the CSR arrays)
         """
-        if node not in self.adj:
+        if not 1 <= node <= self.v:
             raise ValueError(f"Node {node} not in graph")
-        
+
         self._accesses_count += 1
-        
-        return self.adj[node]
-    
-    def get_covered_edges(self, vertex_cover: List[int]) -> Set[frozenset]:
+
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def get_node_edges(self, node: int) -> np.ndarray:
+        """ Returns the ids of the edges incident to the given node """
+        return self.edge_ids[self.indptr[node]:self.indptr[node + 1]]
+
+    def get_covered_mask(self, vertex_cover: Cover) -> np.ndarray:
+        """ Returns a boolean array, indexed by edge id, that is True for the edges covered by the given vertex cover """
+        self._vertex_cover_check_count += 1
+
+        in_cover = self.get_cover_mask(vertex_cover)
+        return in_cover[self.edges[:, 0]] | in_cover[self.edges[:, 1]]
+
+    def get_covered_edges(self, vertex_cover: Cover) -> Set[int]:
         """
         Returns the edges covered by the given vertex cover
-        
-        :param vertex_cover: list of nodes that compose the vertex cover
-        :return: a set of frozensets, each frozenset represents an edge
-        """
-        self._vertex_cover_check_count += 1
-        
-        covered_edges = set()
-        for node in vertex_cover:
-            covered_edges.update(self.node_edges[node])
 
-        return covered_edges
+        :param vertex_cover: list of nodes (or Bitset_Cover) that compose the vertex cover
+        :return: a set of edge ids
+        """
+        return set(np.flatnonzero(self.get_covered_mask(vertex_cover)).tolist())
 
-    def get_all_edges(self) -> Set[frozenset]:
-        """ Returns all edges in G as a set of frozensets where each frozenset represents an edge """
-        return self.all_edges
+    def get_all_edges(self) -> Set[int]:
+        """ Returns the ids of all edges in G as a new set """
+        return set(range(len(self.edges)))
 
-    def get_uncovered_edges(self, vertex_cover: List[int]) -> Set[frozenset]:
-        """ Returns the edges not covered by the given vertex cover """
-        return self.get_all_edges().difference(self.get_covered_edges(vertex_cover))
+    def get_uncovered_edges(self, vertex_cover: Cover) -> Set[int]:
+        """ Returns the ids of the edges not covered by the given vertex cover """
+        return set(np.flatnonzero(~self.get_covered_mask(vertex_cover)).tolist())
 
-    def get_nodes_to_add(self, vertex_cover: List[int]) -> List[int]:
+    def get_nodes_to_add(self, vertex_cover: Cover) -> List[int]:
         """ Returns possible nodes to add into the cover """
-        nodes_to_add=set()
-        for node1, node2 in self.get_uncovered_edges(vertex_cover):
-            nodes_to_add.add(node1)
-            nodes_to_add.add(node2)
-        return list(nodes_to_add)
+        uncovered = ~self.get_covered_mask(vertex_cover)
+        return np.unique(self.edges[uncovered]).tolist()
 
-    def count_covered_edges(self, vertex_cover: List[int]) -> int:
+    def count_covered_edges(self, vertex_cover: Cover) -> int:
         """ Returns the number of edges covered by the given vertex cover """
-        f_set = frozenset(vertex_cover)
-        if f_set in self.count_covered_edges_cache:
-            return self.count_covered_edges_cache[f_set]
-        
-        covered_edges_count = len(self.get_covered_edges(vertex_cover))
-        self.count_covered_edges_cache[f_set] = covered_edges_count
+        if not self.cover_cache.enabled:
+            return int(np.count_nonzero(self.get_covered_mask(vertex_cover)))
+
+        key = self.get_cover_key(vertex_cover)
+        covered_edges_count = self.cover_cache.get(key)
+        if covered_edges_count is None:
+            covered_edges_count = int(np.count_nonzero(self.get_covered_mask(vertex_cover)))
+            self.cover_cache.put(key, covered_edges_count)
         return covered_edges_count
-    
-    def is_vertex_cover(self, vertex_cover: List[int]) -> bool:
+
+    def count_covered_edges_batch(self, vertex_covers) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Counts the edges covered by many vertex covers at once, BATCH_CHUNK (cover, edge) pairs at a time
+
+        :param vertex_covers: boolean matrix with one row per cover and one column per node (column 0 unused),
+                              or list of vertex covers as lists of nodes or Bitset_Covers
+        :return: number of edges covered by each cover, and mask of the covers that are vertex covers of the graph
+        """
+        if not isinstance(vertex_covers, np.ndarray):
+            covers = np.zeros((len(vertex_covers), self.v + 1), dtype=bool)
+            lengths = [len(vertex_cover) for vertex_cover in vertex_covers]
+            nodes = [self.get_cover_nodes(vertex_cover) for vertex_cover in vertex_covers]
+            covers[np.repeat(np.arange(len(vertex_covers)), lengths), np.concatenate(nodes) if nodes else []] = True
+            vertex_covers = covers
+        self._vertex_cover_check_count += len(vertex_covers)
+
+        u, w = self.edges[:, 0], self.edges[:, 1]
+        covered = np.empty(len(vertex_covers), dtype=np.int64)
+        step = max(BATCH_CHUNK // max(self.e, 1), 1)
+        for start in range(0, len(vertex_covers), step):
+            chunk = vertex_covers[start:start + step]
+            covered[start:start + step] = np.count_nonzero(chunk[:, u] | chunk[:, w], axis=1)
+        return covered, covered == self.e
+
+    def is_vertex_cover(self, vertex_cover: Cover) -> bool:
         """
         Returns True if the given vertex cover is a vertex cover of the graph
-        
-        :param vertex_cover: list of nodes that compose the vertex cover
+
+        :param vertex_cover: list of nodes (or Bitset_Cover) that compose the vertex cover
         :return: True if the given vertex cover is a vertex cover of the graph, False otherwise
         """
         return self.count_covered_edges(vertex_cover) == self.e
-    
-    def get_solution_quality(self, solution: List[int]) -> int:
+
+    def get_solution_quality(self, solution: Cover) -> int:
         """ Returns the quality of the given solution """
         return len(solution)
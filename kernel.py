@@ -0,0 +1,182 @@
+"""
+This file contains the data reduction (kernelization) rules applied to a graph before solving it.
+
+The rules only make decisions that are part of some minimum vertex cover, so solving the remaining
+kernel optimally and lifting its solution back gives an optimal cover of the whole graph:
+- degree-1: the neighbour of a degree-1 vertex is taken
+- degree-2: the neighbours of a degree-2 vertex are taken if adjacent, otherwise the three vertices are folded into one
+- domination: a vertex whose closed neighbourhood contains the closed neighbourhood of one of its neighbours is taken
+- crown: the head of a crown (an independent set matched into its neighbourhood) is taken
+"""
+
+import numpy as np
+import networkx as nx
+from collections import deque
+from typing import List
+
+from graph import Graph
+
+
+class Kernel:
+    """
+    Reduced instance of a graph, and the information needed to lift a cover of it back to the original graph.
+
+    Attributes:
+        - adj: dict - adjacency sets of the vertices left in the kernel (folded vertices get ids above G.v)
+        - taken: list of vertices taken into the cover by the reductions
+        - folds: list of (v, u, w, x) degree-2 folds, where v with neighbours u and w was merged into x
+        - offset: int - number of cover vertices decided by the reductions (taken and folded)
+    """
+
+    def __init__(self, G: Graph):
+        """
+        Constructor for the Kernel class, applies the reduction rules until none of them changes the graph
+
+        :param G: graph to reduce
+        """
+        self.G = G
+        self.adj = {node: set(G.get_neighbours(node).tolist()) for node in G.all_nodes}
+        self.taken = []
+        self.folds = []
+        self.next_id = G.v + 1
+        self.queue = deque(self.adj)
+
+        while True:
+            self.apply_low_degree_rules()
+            if self.apply_domination_rule():
+                continue
+            if self.apply_crown_rule():
+                continue
+            break
+
+        self.offset = len(self.taken) + len(self.folds)
+        self.nodes = sorted(self.adj)
+
+    def remove(self, node: int):
+        """ Deletes the node and its edges, queueing the neighbours whose degree dropped """
+        for neighbour in self.adj.pop(node):
+            self.adj[neighbour].discard(node)
+            self.queue.append(neighbour)
+
+    def take(self, node: int):
+        """ Adds the node to the cover and deletes it """
+        self.taken.append(node)
+        self.remove(node)
+
+    def apply_low_degree_rules(self):
+        """ Applies the degree-0, degree-1 and degree-2 rules to the queued vertices """
+        while self.queue:
+            node = self.queue.popleft()
+            if node not in self.adj:
+                continue
+            neighbours = self.adj[node]
+
+            if len(neighbours) == 0:
+                del self.adj[node]
+
+            elif len(neighbours) == 1:
+                self.take(next(iter(neighbours)))
+
+            elif len(neighbours) == 2:
+                u, w = neighbours
+                if w in self.adj[u]:
+                    self.take(u)
+                    self.take(w)
+                else:
+                    self.fold(node, u, w)
+
+    def fold(self, node: int, u: int, w: int):
+        """ Merges the degree-2 node and its two non adjacent neighbours into a single new vertex """
+        x = self.next_id
+        self.next_id += 1
+
+        merged = (self.adj[u] | self.adj[w]) - {node}
+        for removed in (node, u, w):
+            self.remove(removed)
+        self.adj[x] = merged
+        for neighbour in merged:
+            self.adj[neighbour].add(x)
+        self.queue.append(x)
+        self.folds.append((node, u, w, x))
+
+    def apply_domination_rule(self) -> bool:
+        """ Takes every vertex u with a neighbour v such that N[v] is a subset of N[u], returns True if any was taken """
+        changed = False
+        for v in list(self.adj):
+            if v not in self.adj:
+                continue
+            for u in self.adj[v]:
+                if len(self.adj[u]) >= len(self.adj[v]) and self.adj[v] - {u} <= self.adj[u]:
+                    self.take(u)
+                    changed = True
+                    break
+        return changed
+
+    def apply_crown_rule(self) -> bool:
+        """
+        Finds a crown from a maximal matching (Abu-Khzam et al.): the unmatched vertices O are independent,
+        a maximum matching between O and N(O) then grows a crown from the vertices of O it leaves unmatched.
+        Takes the head of the crown and returns True if a non-empty one was found.
+        """
+        matched = set()
+        for u in self.adj:
+            if u in matched:
+                continue
+            for w in self.adj[u]:
+                if w not in matched:
+                    matched.update((u, w))
+                    break
+        outsiders = [node for node in self.adj if node not in matched and self.adj[node]]
+        if not outsiders:
+            return False
+
+        bipartite = nx.Graph()
+        bipartite.add_nodes_from((0, node) for node in outsiders)
+        bipartite.add_edges_from(((0, node), (1, neighbour)) for node in outsiders for neighbour in self.adj[node])
+        matching = nx.bipartite.hopcroft_karp_matching(bipartite, top_nodes=[(0, node) for node in outsiders])
+
+        crown = {node for node in outsiders if (0, node) not in matching}
+        if not crown:
+            return False
+        while True:
+            head = set().union(*(self.adj[node] for node in crown))
+            grown = crown | {matching[(1, node)][1] for node in head}
+            if grown == crown:
+                break
+            crown = grown
+
+        for node in head:
+            self.take(node)
+        for node in crown:
+            self.adj.pop(node, None)
+        return True
+
+    def get_graph(self, cls=Graph) -> Graph:
+        """
+        Returns the kernel as a graph with its vertices relabeled from 1 to the kernel size
+
+        :param cls: Graph or a subclass of it (e.g. Vertex_Cover) to build
+        """
+        label = {node: idx for idx, node in enumerate(self.nodes, start=1)}
+        edges = [(label[u], label[w]) for u in self.nodes for w in self.adj[u] if u < w]
+        return cls.from_edges(len(self.nodes), np.array(edges, dtype=np.int64))
+
+    def lift(self, solution: List[int]) -> List[int]:
+        """
+        Lifts a cover of the kernel graph back to a cover of the original graph
+
+        :param solution: vertex cover of the graph returned by get_graph
+        :return: vertex cover of the original graph, larger by offset
+        """
+        cover = set(self.nodes[node - 1] for node in solution)
+        cover.update(self.taken)
+
+        # undo the folds, last one first, as a folded vertex may itself have been folded again later
+        for node, u, w, x in reversed(self.folds):
+            if x in cover:
+                cover.remove(x)
+                cover.update((u, w))
+            else:
+                cover.add(node)
+
+        return sorted(cover)
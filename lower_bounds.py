@@ -0,0 +1,302 @@
+"""
+This file contains the lower bounds on the size of a minimum vertex cover used to prune the branch and bound search.
+
+Every bound works on the remaining graph of the search, given by the shared degree and removed arrays
+that the search updates in place, and is told about every vertex removal and restoration so that it
+can keep its own structure up to date in O(degree) (or a few augmenting path searches for the LP bound)
+rather than recomputing it at every branch.
+
+Bounds whose initial build is costly check the timer they are given and raise TimeoutError once it runs out,
+so that the search can fall back to a cheaper bound.
+"""
+
+import numpy as np
+from typing import List, Optional
+
+from graph import Graph
+from utils import Timer
+
+
+class Degree_Bound:
+    """ ceil(e / maxdeg): every cover vertex covers at most maxdeg of the remaining edges """
+
+    def __init__(self, G: Graph, degree: np.ndarray, removed: np.ndarray, timer: Optional[Timer] = None):
+        """
+        Constructor for the bound
+
+        :param G: graph searched
+        :param degree: remaining degree of every vertex, updated by the search
+        :param removed: True for the vertices deleted from the remaining graph, updated by the search
+        :param timer: time budget of the initial build, None for no limit
+        """
+        self.G = G
+        self.degree = degree
+        self.removed = removed
+
+    def remove(self, node: int):
+        """ Called after the node is deleted from the remaining graph """
+        pass
+
+    def restore(self, node: int):
+        """ Called after the node is put back in the remaining graph """
+        pass
+
+    def get(self, edges_left: int) -> int:
+        """ Returns the lower bound for the remaining graph """
+        if edges_left == 0:
+            return 0
+        return -(-edges_left // int(self.degree.max()))
+
+
+class Matching_Bound(Degree_Bound):
+    """ Size of a maximal matching of the remaining graph: each matched edge needs its own cover vertex """
+
+    def __init__(self, G: Graph, degree: np.ndarray, removed: np.ndarray, timer: Optional[Timer] = None):
+        Degree_Bound.__init__(self, G, degree, removed, timer)
+        self.mate = [-1] * (G.v + 1)
+        self.size = 0
+        for node in G.all_nodes:
+            if not removed[node] and self.mate[node] == -1:
+                self.rematch(node)
+
+    def rematch(self, node: int):
+        """ Matches the free node with any free neighbour in the remaining graph """
+        for neighbour in self.G.indices[self.G.indptr[node]:self.G.indptr[node + 1]].tolist():
+            if self.mate[neighbour] == -1 and not self.removed[neighbour]:
+                self.mate[node] = neighbour
+                self.mate[neighbour] = node
+                self.size += 1
+                return
+
+    def remove(self, node: int):
+        # only the former mate of the node can have become matchable again
+        mate = self.mate[node]
+        if mate != -1:
+            self.mate[node] = self.mate[mate] = -1
+            self.size -= 1
+            self.rematch(mate)
+
+    def restore(self, node: int):
+        self.rematch(node)
+
+    def get(self, edges_left: int) -> int:
+        return self.size
+
+
+class Clique_Cover_Bound(Degree_Bound):
+    """
+    Sum over a partition of the vertices into cliques of (clique size - 1): all but one vertex of a clique must be in the cover.
+    The partition is built greedily once, deleting vertices keeps every part a clique, so only the sizes are maintained.
+    """
+
+    def __init__(self, G: Graph, degree: np.ndarray, removed: np.ndarray, timer: Optional[Timer] = None):
+        Degree_Bound.__init__(self, G, degree, removed, timer)
+        self.clique = self.get_clique_partition()
+        self.clique_size = np.bincount([self.clique[node] for node in G.all_nodes if not removed[node]],
+                                       minlength=max(self.clique) + 1).tolist()
+        self.alive = sum(self.clique_size)
+        self.cliques = sum(1 for size in self.clique_size if size > 0)
+
+    def get_clique_partition(self) -> List[int]:
+        """ Greedily grows a clique from each unassigned vertex, highest degree first """
+        G = self.G
+        clique = [-1] * (G.v + 1)
+        neighbours = lambda node: set(G.indices[G.indptr[node]:G.indptr[node + 1]].tolist())
+        count = 0
+        for node in sorted(G.all_nodes, key=lambda node: -self.degree[node]):
+            if clique[node] != -1 or self.removed[node]:
+                continue
+            clique[node] = count
+            candidates = {w for w in neighbours(node) if clique[w] == -1 and not self.removed[w]}
+            while candidates:
+                w = max(candidates, key=lambda w: self.degree[w])
+                clique[w] = count
+                candidates &= neighbours(w)
+            count += 1
+        return clique
+
+    def remove(self, node: int):
+        clique = self.clique[node]
+        self.clique_size[clique] -= 1
+        self.alive -= 1
+        if self.clique_size[clique] == 0:
+            self.cliques -= 1
+
+    def restore(self, node: int):
+        clique = self.clique[node]
+        if self.clique_size[clique] == 0:
+            self.cliques += 1
+        self.clique_size[clique] += 1
+        self.alive += 1
+
+    def get(self, edges_left: int) -> int:
+        return self.alive - self.cliques
+
+
+class LP_Bound(Degree_Bound):
+    """
+    ceil of the optimum of the vertex cover LP relaxation, which is half-integral (Nemhauser-Trotter) and equals half
+    the size of a maximum matching in the bipartite double cover of the graph (left copy u - right copy w for every edge).
+    The maximum matching is kept up to date by searching augmenting paths from the copies of the removed or restored vertex.
+    """
+
+    def __init__(self, G: Graph, degree: np.ndarray, removed: np.ndarray, timer: Optional[Timer] = None):
+        Degree_Bound.__init__(self, G, degree, removed, timer)
+        self.mate_left = [-1] * (G.v + 1)
+        self.mate_right = [-1] * (G.v + 1)
+        self.visited = [0] * (G.v + 1)
+        self.search = 0
+        self.size = 0
+        self.build_matching(timer)
+
+    def build_matching(self, timer: Optional[Timer]):
+        """
+        Builds the initial maximum matching of the double cover: a greedy matching, then Hopcroft-Karp phases,
+        each augmenting along a maximal set of disjoint shortest augmenting paths (O(sqrt(v)) phases of O(e)).
+        Raises TimeoutError if the timer runs out first.
+        """
+        G = self.G
+        removed = self.removed
+        mate_left, mate_right = self.mate_left, self.mate_right
+        nodes = [node for node in G.all_nodes if not removed[node]]
+        adjacency = [[]] + [G.indices[G.indptr[node]:G.indptr[node + 1]].tolist() for node in G.all_nodes]
+
+        for node in nodes:
+            for neighbour in adjacency[node]:
+                if mate_right[neighbour] == -1 and not removed[neighbour]:
+                    mate_left[node] = neighbour
+                    mate_right[neighbour] = node
+                    self.size += 1
+                    break
+
+        while True:
+            # BFS layers of the left copies from the free ones along alternating paths
+            free = [node for node in nodes if mate_left[node] == -1]
+            layer = [-1] * (G.v + 1)
+            for node in free:
+                layer[node] = 0
+            queue = free[:]
+            found = False
+            for node in queue:
+                for neighbour in adjacency[node]:
+                    if removed[neighbour]:
+                        continue
+                    mate = mate_right[neighbour]
+                    if mate == -1:
+                        found = True
+                    elif layer[mate] == -1:
+                        layer[mate] = layer[node] + 1
+                        queue.append(mate)
+            if not found:
+                return
+
+            # DFS along the layers from every free left copy, dead ends are removed from the layers
+            position = [0] * (G.v + 1)
+            for root in free:
+                if timer is not None and timer.cutoff():
+                    raise TimeoutError("LP bound build ran out of time")
+                path, via = [root], []
+                while path:
+                    node = path[-1]
+                    neighbours = adjacency[node]
+                    while position[node] < len(neighbours):
+                        neighbour = neighbours[position[node]]
+                        position[node] += 1
+                        if removed[neighbour]:
+                            continue
+                        mate = mate_right[neighbour]
+                        if mate == -1:
+                            via.append(neighbour)
+                            for a, b in zip(path, via):
+                                mate_left[a] = b
+                                mate_right[b] = a
+                            self.size += 1
+                            path = []
+                            break
+                        if layer[mate] == layer[node] + 1:
+                            via.append(neighbour)
+                            path.append(mate)
+                            break
+                    else:
+                        layer[node] = -1
+                        path.pop()
+                        if via:
+                            via.pop()
+
+    def augment(self, start: int, mate_a: List[int], mate_b: List[int]) -> bool:
+        """
+        Looks for an augmenting path from the free vertex start of side a to a free vertex of side b and flips it.
+        As the double cover is symmetric, searching from the right side is the same with the mate arrays swapped.
+        """
+        G = self.G
+        self.search += 1
+        self.visited[start] = self.search
+        path = [start]
+        stack = [iter(G.indices[G.indptr[start]:G.indptr[start + 1]].tolist())]
+        while stack:
+            found = None
+            for neighbour in stack[-1]:
+                if self.removed[neighbour]:
+                    continue
+                mate = mate_b[neighbour]
+                if mate == -1:
+                    found = neighbour
+                    break
+                if self.visited[mate] != self.search:
+                    self.visited[mate] = self.search
+                    path.append(neighbour)
+                    path.append(mate)
+                    stack.append(iter(G.indices[G.indptr[mate]:G.indptr[mate + 1]].tolist()))
+                    break
+            else:
+                stack.pop()
+                if len(path) > 1:
+                    del path[-2:]
+                else:
+                    path.pop()
+                continue
+
+            if found is not None:
+                # path alternates a-side vertices and the b-side vertices they will be matched to
+                path.append(found)
+                for idx in range(0, len(path), 2):
+                    a, b = path[idx], path[idx + 1]
+                    mate_a[a] = b
+                    mate_b[b] = a
+                self.size += 1
+                return True
+
+        return False
+
+    def remove(self, node: int):
+        freed_left = self.mate_right[node]
+        freed_right = self.mate_left[node]
+        if freed_right != -1:
+            self.mate_left[node] = self.mate_right[freed_right] = -1
+            self.size -= 1
+        if freed_left != -1:
+            self.mate_right[node] = self.mate_left[freed_left] = -1
+            self.size -= 1
+
+        # any new augmenting path has to end at a vertex that lost its mate
+        if freed_left != -1 and freed_left != node:
+            self.augment(freed_left, self.mate_left, self.mate_right)
+        if freed_right != -1 and freed_right != node and self.mate_right[freed_right] == -1:
+            self.augment(freed_right, self.mate_right, self.mate_left)
+
+    def restore(self, node: int):
+        # any new augmenting path has to end at one of the two copies of the restored vertex
+        self.augment(node, self.mate_left, self.mate_right)
+        if self.mate_right[node] == -1:
+            self.augment(node, self.mate_right, self.mate_left)
+
+    def get(self, edges_left: int) -> int:
+        return (self.size + 1) // 2
+
+
+LOWER_BOUNDS = {
+    "degree": Degree_Bound,
+    "matching": Matching_Bound,
+    "clique": Clique_Cover_Bound,
+    "lp": LP_Bound,
+}
@@ -10,6 +10,9 @@ import regex
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
+
+from results import Result_Store, DEFAULT_DATABASE
 
 TIME_START = 0
 TIME_STOP = 1000
@@ -24,6 +27,8 @@ QUALITIES = np.linspace(QUALITIES_START, QUALITIES_STOP, QUALITIES_RESOLUTION)
 CUTOFF_TIMES_LOOSE = [10, 40, 100, 1000]
 QUALITIES_LOOSE = [2200, 2210, 2220, 2230, 2240]
 
+LOAD_WORKERS = 8    # threads reading trace files at the same time (the pandas CSV parser releases the GIL)
+
 OPT = {"power": 2203, "star2": 4542}
 
 # %% functions
@@ -37,36 +42,72 @@ def load_trace_file(filename):
 
 def load_trace_files(dir, graph, algo):
     pattern = f"{graph}_{algo}_[\S\s]*\.trace"
-    traces = []
+    paths = []
     for path, subdirs, files in os.walk(dir):
         for file in files:
             if regex.match(pattern, file):
-                traces.append(load_trace_file(path+"\\"+file))
+                paths.append(os.path.join(path, file))
+    
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        traces = list(executor.map(load_trace_file, sorted(paths)))
+    
+    return pd.concat(traces, ignore_index=True)
+
+
+def load_trace_store(db, graph, algo, **filters):
+    """ Loads the trace records of all the runs of the algorithm on the graph from a result store in one query """
+    store = Result_Store(db)
+    trace = store.get_traces(graph=graph, algo=algo, **filters)
+    store.close()
+    return trace
+
+
+def calc_cumulative_counts(graph, trace: pd.DataFrame, cutoff_times, qualities):
+    """
+    Counts the trace records by cutoff time and relative quality in one pass: each record is assigned to the first
+    cutoff time and quality it satisfies (with searchsorted on the sorted grids), and cumulative sums of the resulting
+    2D histogram give the number of records with time <= cutoff_time and relative quality <= quality for every pair.
+    
+    Returns:
+        counts: array (cutoff_times x qualities) of the records satisfying both
+        by_quality: array (qualities) of the records with relative quality <= quality, at any time
+        by_time: array (cutoff_times) of the records with time <= cutoff_time, at any quality
+    """
+    cutoff_times = np.asarray(cutoff_times, dtype=float)
+    qualities = np.asarray(qualities, dtype=float)
+    time_order = np.argsort(cutoff_times)
+    quality_order = np.argsort(qualities)
+    
+    relative_quality = (trace.quality.to_numpy() - OPT[graph]) / OPT[graph]
+    time_bins = np.searchsorted(cutoff_times[time_order], trace.time.to_numpy(), side="left")
+    quality_bins = np.searchsorted(qualities[quality_order], relative_quality, side="left")
+    
+    # the extra last bin holds the records beyond the largest cutoff time / quality
+    shape = (len(cutoff_times) + 1, len(qualities) + 1)
+    histogram = np.bincount(time_bins * shape[1] + quality_bins, minlength=shape[0] * shape[1]).reshape(shape)
+    cumulative = histogram.cumsum(axis=0).cumsum(axis=1)
     
-    return pd.concat(traces)
+    # back to the order of the given grids
+    time_rank = np.argsort(time_order)
+    quality_rank = np.argsort(quality_order)
+    counts = cumulative[:-1, :-1][time_rank][:, quality_rank]
+    by_quality = cumulative[-1, :-1][quality_rank]
+    by_time = cumulative[:-1, -1][time_rank]
+    return counts, by_quality, by_time
 
 
 def calc_qrtd(graph, trace: pd.DataFrame, cutoff_times, qualities):
-    qrtd = pd.DataFrame(index=cutoff_times, columns=qualities)
-    for cutoff_time in cutoff_times:
-        for quality in qualities:
-            n_runs = len(trace[(((trace.quality-OPT[graph])/OPT[graph]) <= quality)].axes[0])
-            n_success = len(trace[(trace.time <= cutoff_time) & (
-                ((trace.quality-OPT[graph])/OPT[graph]) <= quality)].axes[0])
-            qrtd.at[cutoff_time, quality] = n_success / \
-                n_runs if n_runs != 0 else np.nan
-    return qrtd
+    counts, by_quality, _ = calc_cumulative_counts(graph, trace, cutoff_times, qualities)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        qrtd = np.where(by_quality[None, :] != 0, counts / by_quality[None, :], np.nan)
+    return pd.DataFrame(qrtd, index=cutoff_times, columns=qualities)
 
 
 def calc_sqd(graph, trace, cutoff_times, qualities):
-    sqd = pd.DataFrame(index=qualities, columns=cutoff_times)
-    for cutoff_time in cutoff_times:
-        for quality in qualities:
-            n_runs = len(trace[(trace.time <= cutoff_time)].axes[0])
-            n_success = len(trace[(trace.time <= cutoff_time) & (((trace.quality-OPT[graph])/OPT[graph])<= quality)].axes[0])
-            sqd.at[quality, cutoff_time] = n_success / \
-                n_runs if n_runs != 0 else np.nan
-    return sqd
+    counts, _, by_time = calc_cumulative_counts(graph, trace, cutoff_times, qualities)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sqd = np.where(by_time[:, None] != 0, counts / by_time[:, None], np.nan)
+    return pd.DataFrame(sqd.T, index=qualities, columns=cutoff_times)
 
 
 def plot_boxplot(trace):
@@ -113,13 +154,15 @@ def get_qualities(start, stop, resolution, mode):
         raise ValueError("mode not supported")
 
 # %% load trace
-# import trace file from different runs
+# import the records of the different runs from the result store (see results.py)
 filename = r"E:\Users\wizar\OneDrive\Documents\github\CSE-6140-project\plotting\star\power_LS1_1000_20221203.trace"
 dirname = "."
+db = DEFAULT_DATABASE
 graph = "power"
 algo = "LS1"
 # trace=load_trace_file(filename)
-trace = load_trace_files(dirname, graph, algo)
+# trace = load_trace_files(dirname, graph, algo)
+trace = load_trace_store(db, graph, algo)[["time", "quality"]]
 # print(trace.columns)
 
 # %% calculation
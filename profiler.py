@@ -0,0 +1,92 @@
+"""
+This file contains the profiling modes that can be enabled around the execution of an algorithm.
+
+Modes:
+- off: no instrumentation, memory usage is not reported
+- rss: a background thread samples the resident set size of the process every RSS_SAMPLE_INTERVAL seconds
+- tracemalloc: exact current and peak Python heap usage, slows down allocation-heavy algorithms several times
+- cprofile: per-function call counts and times, the hottest functions are reported and the full profile is dumped
+"""
+
+import os
+import pstats
+import psutil
+import cProfile
+import threading
+import tracemalloc
+from typing import Dict
+
+PROFILE_MODES = ("off", "rss", "tracemalloc", "cprofile")
+RSS_SAMPLE_INTERVAL = 0.05  # seconds between two RSS samples
+HOT_PATHS = 20              # number of functions, by cumulative time, reported in the stats of a cprofile run
+PROFILE_EXTENSION = ".prof"
+
+
+class Profiler:
+    """ This class is used to measure the memory usage or the time spent per function while the algorithm runs """
+
+    def __init__(self, mode: str):
+        """ Constructor for the Profiler class """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Invalid profiling mode {mode}, expected one of {PROFILE_MODES}")
+        self.mode = mode
+        self.profile = None
+
+    def start(self):
+        """ Starts profiling """
+        if self.mode == "rss":
+            self.process = psutil.Process()
+            self.samples = [self.process.memory_info().rss]
+            self.stopped = threading.Event()
+            self.sampler = threading.Thread(target=self.sample_rss, daemon=True)
+            self.sampler.start()
+
+        elif self.mode == "tracemalloc":
+            tracemalloc.start()
+
+        elif self.mode == "cprofile":
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def sample_rss(self):
+        """ Body of the sampling thread of the rss mode """
+        while not self.stopped.wait(RSS_SAMPLE_INTERVAL):
+            self.samples.append(self.process.memory_info().rss)
+
+    def stop(self) -> Dict:
+        """
+        Stops profiling
+
+        :return: results of the profiling, as saved in the stats JSON (memory usages are in bytes, None if not measured)
+        """
+        results = {"mode": self.mode, "current_memory_usage": None, "peak_memory_usage": None}
+
+        if self.mode == "rss":
+            self.stopped.set()
+            self.sampler.join()
+            self.samples.append(self.process.memory_info().rss)
+            results["current_memory_usage"] = self.samples[-1]
+            results["peak_memory_usage"] = max(self.samples)
+            results["rss_samples"] = len(self.samples)
+
+        elif self.mode == "tracemalloc":
+            results["current_memory_usage"], results["peak_memory_usage"] = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        elif self.mode == "cprofile":
+            self.profile.disable()
+            stats = pstats.Stats(self.profile)
+            hot_paths = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:HOT_PATHS]
+            results["hot_paths"] = [{"function": f"{os.path.basename(file)}:{line}({name})", "calls": calls,
+                                     "total_time": round(total_time, 6), "cumulative_time": round(cumulative_time, 6)}
+                                    for (file, line, name), (_, calls, total_time, cumulative_time, _) in hot_paths]
+
+        return results
+
+    def dump(self, path: str):
+        """ Saves the full cProfile profile (readable with pstats or snakeviz) when profiling in cprofile mode """
+        if self.profile is None:
+            return
+        path = path + PROFILE_EXTENSION
+        self.profile.dump_stats(path)
+        print(f"Profile saved to {path}")
@@ -0,0 +1,191 @@
+"""
+This file contains the result store: a single SQLite database holding the solutions, traces and stats of many runs,
+as an alternative to one .sol, .trace and .json file per run.
+
+Runs are indexed by graph, algorithm, cutoff time and seed, and a whole experiment is read back with one query
+(see Result_Store.get_runs and Result_Store.get_traces).
+
+Existing output files can be imported with:
+$ python -m results -db <database> -output <output directory> -stats <stats directory>
+"""
+
+import os
+import re
+import json
+import sqlite3
+import argparse
+from typing import Dict, List, Optional
+
+DEFAULT_DATABASE = "results.db"
+FILTERS = ("name", "graph", "algo", "cutoff", "seed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    graph TEXT NOT NULL,
+    algo TEXT NOT NULL,
+    cutoff INTEGER NOT NULL,
+    seed INTEGER,
+    quality INTEGER,
+    solution TEXT,
+    stats TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_experiment ON runs (graph, algo, cutoff, seed);
+CREATE TABLE IF NOT EXISTS records (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    time REAL NOT NULL,
+    quality INTEGER NOT NULL,
+    graph_reads INTEGER,
+    vertex_cover_checks INTEGER
+);
+CREATE INDEX IF NOT EXISTS records_run ON records (run_id);
+"""
+
+
+class Result_Store:
+    """
+    SQLite database of runs (one row per run, with its solution and stats) and of their trace records
+    (one row per record). Several processes can write to it at the same time.
+    """
+
+    def __init__(self, path: str = DEFAULT_DATABASE):
+        """ Opens the database at the given path, creating it if needed """
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def save_run(self, name: str, graph: str, algo: str, cutoff: int, seed: Optional[int],
+                 quality: Optional[int], solution: Optional[List[int]], stats: Dict):
+        """
+        Saves a run, replacing any previous run with the same name
+
+        :param name: name of the run, as the name of its output files (see exec.get_output_name)
+        :param seed: random seed, None for deterministic algorithms
+        :param stats: stats of the run (see Trace.get_stats), its time, quality, graph_reads and
+                      vertex_cover_checks series are stored as the trace records
+        """
+        stats = dict(stats)
+        series = [stats.pop(column) for column in ("time", "quality", "graph_reads", "vertex_cover_checks")]
+        formatted_solution = ",".join(map(str, solution)) if solution is not None else None
+
+        with self.connection:
+            self.connection.execute("DELETE FROM runs WHERE name = ?", (name,))
+            run_id = self.connection.execute(
+                "INSERT INTO runs (name, graph, algo, cutoff, seed, quality, solution, stats) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, graph, algo, cutoff, seed, quality, formatted_solution, json.dumps(stats))).lastrowid
+            self.connection.executemany(
+                "INSERT INTO records (run_id, time, quality, graph_reads, vertex_cover_checks) VALUES (?, ?, ?, ?, ?)",
+                ((run_id, *record) for record in zip(*series)))
+
+    def has_run(self, name: str) -> bool:
+        """ Returns True if a run with the given name is stored """
+        return self.connection.execute("SELECT 1 FROM runs WHERE name = ?", (name,)).fetchone() is not None
+
+    def get_where(self, filters: Dict) -> tuple:
+        """ Builds the WHERE clause for the given filters, a filter value can be a single value or a list of values """
+        clauses, values = [], []
+        for column, value in filters.items():
+            if column not in FILTERS:
+                raise ValueError(f"Invalid filter {column}, expected one of {FILTERS}")
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(f"runs.{column} IN ({', '.join('?' * len(value))})")
+                values.extend(value)
+            else:
+                clauses.append(f"runs.{column} = ?")
+                values.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", values
+
+    def get_runs(self, **filters) -> List[Dict]:
+        """
+        Returns the runs matching the filters (e.g. graph="power", algo=["LS1", "LS2"], cutoff=1000)
+
+        :return: one dictionary per run with its name, graph, algo, cutoff, seed, quality, solution (list of nodes) and stats
+        """
+        where, values = self.get_where(filters)
+        rows = self.connection.execute(
+            f"SELECT name, graph, algo, cutoff, seed, quality, solution, stats FROM runs{where} ORDER BY runs.id", values)
+
+        runs = []
+        for name, graph, algo, cutoff, seed, quality, solution, stats in rows:
+            runs.append({"name": name, "graph": graph, "algo": algo, "cutoff": cutoff, "seed": seed, "quality": quality,
+                         "solution": [int(node) for node in solution.split(",") if node] if solution is not None else None,
+                         "stats": json.loads(stats)})
+        return runs
+
+    def get_traces(self, **filters):
+        """
+        Returns the trace records of all the runs matching the filters (see get_runs) in a single query
+
+        :return: pandas DataFrame with columns name, graph, algo, cutoff, seed, time, quality, graph_reads, vertex_cover_checks
+        """
+        import pandas as pd
+
+        where, values = self.get_where(filters)
+        query = ("SELECT runs.name, runs.graph, runs.algo, runs.cutoff, runs.seed, records.time, records.quality, "
+                 "records.graph_reads, records.vertex_cover_checks FROM records JOIN runs ON records.run_id = runs.id"
+                 f"{where} ORDER BY runs.id, records.rowid")
+        return pd.read_sql_query(query, self.connection, params=values)
+
+
+def import_files(store: Result_Store, output_dir: str, stats_dir: str) -> int:
+    """
+    Imports the runs saved as .sol/.trace/.json files in the output and stats directories into the store
+
+    :return: number of runs imported
+    """
+    from exec import ALGOS
+    # <graph>_<algo>_<cutoff>[_<seed>], or <graph>_<algo>+<algo>..._<cutoff>_<seed>_p<processes> for portfolio runs
+    algo_pattern = f"(?:{'|'.join(ALGOS)})"
+    name_pattern = re.compile(rf"^(.+)_({algo_pattern}(?:\+{algo_pattern})*)_(\d+)(?:_(\d+))?(?:_p\d+)?$")
+
+    imported = 0
+    for file in sorted(os.listdir(stats_dir)):
+        name, extension = os.path.splitext(file)
+        if extension != ".json":
+            continue
+        match = name_pattern.match(name)
+        if match is None:
+            print(f"Skipping {file}: not named as the stats of a run")
+            continue
+        graph, algo, cutoff, seed = match.groups()
+
+        with open(os.path.join(stats_dir, file)) as f:
+            stats = json.load(f)
+        stats.setdefault("graph_reads", [None] * len(stats["time"]))
+        stats.setdefault("vertex_cover_checks", [None] * len(stats["time"]))
+
+        quality, solution = None, None
+        sol_path = os.path.join(output_dir, name + ".sol")
+        if os.path.exists(sol_path):
+            with open(sol_path) as f:
+                lines = f.read().split("\n")
+            quality = int(lines[0]) if lines[0] not in ("", "None") else None
+            solution = [int(node) for node in lines[1].split(",") if node] if len(lines) > 1 else []
+
+        store.save_run(name, graph, algo, int(cutoff), int(seed) if seed is not None else None, quality, solution, stats)
+        imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import the output and stats files of previous runs into a result store')
+    parser.add_argument('-db', type=str, default=DEFAULT_DATABASE, help='path to the result store')
+    parser.add_argument('-output', type=str, default='output', help='directory with the .sol and .trace files')
+    parser.add_argument('-stats', type=str, default='stats', help='directory with the .json stats files')
+    args = parser.parse_args()
+
+    store = Result_Store(args.db)
+    print(f"Imported {import_files(store, args.output, args.stats)} runs into {args.db}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,24 +2,51 @@
 This script will run exec.py for all the alogrithms and graphs to generate
 all the solution and trace files.
 
+Every combination of graph, algorithm, cutoff time and seed is run in a pool of worker processes,
+each worker loading a graph only the first time one of its runs needs it. Runs whose solution,
+trace and stats files (or entry in the -store result store) already exist are skipped, so an interrupted
+sweep can be resumed.
+
 It can be executed following the required format:
 $ python -m runner -inst <directory of graphs> -time <cutoff in seconds> -seed <random seed>
+Several cutoff times, seeds and algorithms can be given at once, e.g.:
+$ python -m runner -inst data -alg LS1 NuMVC -time 60 600 -seed 1 2 3 -workers 8
 """
 
 import os
+import io
 import argparse
-from exec import ALGOS, print_args
+import contextlib
+import traceback
+from time import time
+from typing import List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from exec import ALGOS, OUTPUT_DIR, STATS_DIR, print_args, parse_args as parse_exec_args, get_algorithm, get_output_name, run
+from vertex_cover import Vertex_Cover
+from utils import Trace
+from results import Result_Store
+
+OUTPUT_FILES = ((OUTPUT_DIR, ".sol"), (OUTPUT_DIR, Trace.EXTENSION), (STATS_DIR, Trace.STATS_EXTENSION))
+
+# Graphs loaded by the current worker process, by path
+loaded_graphs = {}
+
 
 def parse_args():
     """ Parses the arguments passed to the script """
-    
+
     # Creating the parser
     parser = argparse.ArgumentParser(description='Run all the algorithms on all datasets')
-    
+
     parser.add_argument('-inst', type=str, help='directory with the graphs to be used', required=True)
-    parser.add_argument('-time', type=int, help='cutoff time in seconds', required=True)
-    parser.add_argument('-seed', type=int, help='random seed', required=True)
-    
+    parser.add_argument('-alg', nargs='+', choices=ALGOS.keys(), default=list(ALGOS.keys()), help='algorithms to run (default: all)')
+    parser.add_argument('-time', nargs='+', type=int, help='cutoff times in seconds', required=True)
+    parser.add_argument('-seed', nargs='+', type=int, help='random seeds', required=True)
+    parser.add_argument('-workers', type=int, default=os.cpu_count(), help='number of runs executed in parallel (default: number of cores)')
+    parser.add_argument('-force', action='store_true', help='rerun the combinations whose output files already exist')
+    parser.add_argument('-store', type=str, help='save the runs in this result store (see results.py) instead of output files')
+
     return parser.parse_args()
 
 
@@ -29,19 +56,91 @@ def get_graphs(dir):
     return [item for item in items if item.endswith('.graph')]
 
 
+def get_runs(args: argparse.Namespace) -> List[argparse.Namespace]:
+    """
+    Builds the exec.py arguments of every graph x algorithm x cutoff time x seed combination.
+    Deterministic algorithms are run once per graph and cutoff time, as their output does not depend on the seed.
+    """
+    runs = []
+    names = set()
+    for graph in sorted(get_graphs(args.inst)):
+        for algo in args.alg:
+            for cutoff in args.time:
+                for seed in args.seed:
+                    run_args = parse_exec_args(["-inst", os.path.join(args.inst, graph), "-alg", algo,
+                                                "-time", str(cutoff), "-seed", str(seed)]
+                                               + (["-store", args.store] if args.store is not None else []))
+                    name = get_output_name(run_args, get_algorithm(run_args))
+                    if name not in names:
+                        names.add(name)
+                        runs.append(run_args)
+    return runs
+
+
+def is_done(run_args: argparse.Namespace, store: Optional[Result_Store]) -> bool:
+    """ Returns True if the run is already in the store, or if all its output files already exist """
+    name = get_output_name(run_args, get_algorithm(run_args))
+    if store is not None:
+        return store.has_run(name)
+    return all(os.path.exists(os.path.join(directory, name + extension)) for directory, extension in OUTPUT_FILES)
+
+
+def execute(run_args: argparse.Namespace) -> Tuple[Optional[int], float, Optional[str]]:
+    """
+    Executes a single run in the worker process, its console output is discarded.
+
+    Returns:
+        quality: quality of the solution found, None if no solution was found
+        elapsed: wall-clock time of the run, in seconds
+        error: traceback of the run if it failed, None otherwise
+    """
+    start = time()
+    try:
+        if run_args.inst not in loaded_graphs:
+            loaded_graphs[run_args.inst] = Vertex_Cover(run_args.inst)
+        G = loaded_graphs[run_args.inst]
+        G.init_graph()      # resetting the counters, caches and solution left by the previous run
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            quality, _ = run(run_args, G)
+        return quality, time() - start, None
+
+    except Exception:
+        return None, time() - start, traceback.format_exc()
+
+
 def main():
     args = parse_args()
-    
+
     if not os.path.exists(args.inst):
         raise ValueError('Invalid directory')
-        
+
     print_args(args)
-    
-    for algo in ALGOS.keys():
-        for graph in get_graphs(args.inst):
-            os.system(f"python -m exec -inst {os.path.join(args.inst, graph)} -alg {algo} -time {args.time} -seed {args.seed}")
-    
+
+    runs = get_runs(args)
+    store = Result_Store(args.store) if args.store is not None else None
+    todo = runs if args.force else [run_args for run_args in runs if not is_done(run_args, store)]
+    if store is not None:
+        store.close()
+    print(f"\n{len(runs)} runs, {len(runs) - len(todo)} already done, {len(todo)} to execute on {args.workers} workers\n")
+
+    failed = 0
+    start = time()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(execute, run_args): run_args for run_args in todo}
+        for done, future in enumerate(as_completed(futures), start=1):
+            run_args = futures[future]
+            quality, elapsed, error = future.result()
+            name = get_output_name(run_args, get_algorithm(run_args))
+
+            status = f"quality {quality}" if error is None else "FAILED"
+            print(f"[{done:>{len(str(len(todo)))}}/{len(todo)}] {name:<40} {status:<16} {elapsed:8.2f} s | total {time() - start:8.1f} s")
+            if error is not None:
+                failed += 1
+                print(error)
+
+    print(f"\nDone in {time() - start:.1f} s, {failed} runs failed")
+
 
 if __name__ == '__main__':
     main()
-    
\ No newline at end of file
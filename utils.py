@@ -6,32 +6,91 @@ import json
 import platform
 import psutil
 import logging
-from time import time
+import atexit
+import threading
+from time import perf_counter_ns
 from typing import List
 from pathlib import Path
+from collections import deque
 
 from graph import Graph
 
+TIMER_MODE = "amortized"            # "exact" | "amortized" | "signal" (see Timer)
+TIMER_CHECK_PERIOD_NS = 1_000_000   # target time between two clock reads of an amortized timer
+TIMER_MAX_CHECK_INTERVAL = 4096     # max number of cutoff() calls between two clock reads of an amortized timer
+
+TRACE_MAX_RECORDS = 1 << 16             # records of a streamed trace kept in memory for the stats, older ones are dropped (None to keep all)
+TRACE_FLUSH_RECORDS = 64                # a streamed trace is written to disk every TRACE_FLUSH_RECORDS records...
+TRACE_FLUSH_INTERVAL_NS = 1_000_000_000 # ...or when a record comes TRACE_FLUSH_INTERVAL_NS after the last write
+
                          
 class Timer:
-    """ This class is used to measure the time spent by the algorithm and comply with the time limit """
+    """
+    This class is used to measure the time spent by the algorithm and comply with the time limit
+    
+    Modes of cutoff():
+        - exact: reads the clock at every call
+        - amortized: reads the clock every check_interval calls, the interval is recalibrated at every read
+                     so that the clock is read about every TIMER_CHECK_PERIOD_NS nanoseconds
+        - signal: never reads the clock, a background thread sets the expired flag at the deadline
+    In every mode, hot loops can also test the expired attribute directly once the cutoff has been reached.
+    """
+    
+    MODES = ("exact", "amortized", "signal")
     
-    def __init__(self, time_limit: int):
+    def __init__(self, time_limit: int, mode: str = TIMER_MODE):
         """ Constructor for the Timer class """
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid timer mode {mode}, expected one of {self.MODES}")
         self.time_limit = time_limit
+        self.mode = mode
         self.start_time = None
+        self.expired = False
         
     def start(self):
         """ Starts the timer """
-        self.start_time = time()
+        self.start_time = perf_counter_ns()
+        self.deadline = self.start_time + int(self.time_limit * 1e9)
+        self.expired = False
+        self.calls = 0
+        self.check_interval = 1
+        self.last_check = self.start_time
+        
+        if self.mode == "signal":
+            signal = threading.Timer(max(self.time_limit, 0), self.stop)
+            signal.daemon = True
+            signal.start()
         
     def elapsed(self) -> float:
         """ Returns the elapsed time (in seconds) since the timer was started """
-        return round(time() - self.start_time, 2)
+        return round((perf_counter_ns() - self.start_time) / 1e9, 2)
     
     def cutoff(self) -> bool:
-        """ Returns True if the time limit has been exceeded, False otherwise """
-        return self.elapsed() >= self.time_limit
+        """ Returns True if the time limit has been exceeded or the timer was stopped, False otherwise """
+        if self.expired or self.mode == "signal":
+            return self.expired
+        
+        self.calls += 1
+        if self.calls < self.check_interval:
+            return False
+        
+        now = perf_counter_ns()
+        if now >= self.deadline:
+            self.expired = True
+            return True
+        
+        if self.mode == "amortized":
+            # calls per TIMER_CHECK_PERIOD_NS at the rate measured since the last read, without overshooting the deadline
+            call_time = max((now - self.last_check) // self.calls, 1)
+            period = min(TIMER_CHECK_PERIOD_NS, self.deadline - now)
+            self.check_interval = int(min(max(period // call_time, 1), TIMER_MAX_CHECK_INTERVAL))
+            self.last_check = now
+        self.calls = 0
+        return False
+
+    def stop(self):
+        """ Makes cutoff() return True from now on, e.g. to end an algorithm running in another thread early """
+        self.expired = True
     
     
 class Trace:
@@ -39,27 +98,91 @@ class Trace:
     This class is used to track the best solutions found by the algorithm at each iteration,
     and to generate the requred trace file.
     It also tracks the number of access to the graph in JSON format for easier later access.
+    
+    When given a path, the trace file is streamed: a record improving on the best quality so far is written
+    right away, so that a run that is killed (even by SIGKILL) keeps the solutions found so far, and other
+    records are buffered and appended every TRACE_FLUSH_RECORDS records or TRACE_FLUSH_INTERVAL_NS, or at exit. Only the last TRACE_MAX_RECORDS records are
+    then kept in memory for the stats. A trace that is not streamed (e.g. of a run saved in a result store)
+    keeps all its records in memory, as they are only persisted from there.
     """
     
     EXTENSION = ".trace"
     STATS_EXTENSION = ".json"
     
-    def __init__(self, timer: Timer, graph: Graph):
+    def __init__(self, timer: Timer, graph: Graph, path: str = None, max_records: int = TRACE_MAX_RECORDS):
+        """ Constructor for the Trace class, max_records only applies when the trace is streamed to path """
         self.timer = timer
         self.graph = graph
-        self.list = []
-        self.graph_stats = []
+        if path is None:
+            max_records = None
+        self.list = deque(maxlen=max_records)
+        self.graph_stats = deque(maxlen=max_records)
+        self.dropped_records = 0
         self.current_memory_usage = None
         self.peak_memory_usage = None
+        self.profile = None         # results of the profiling mode of the run (see profiler.py)
+        self.quality_offset = 0     # added to every quality, e.g. the vertices decided by kernelization
+        
+        self.file = None
+        if path is not None:
+            self.open(path)
+        
+    def open(self, path: str):
+        """ Starts streaming the records to the trace file at the given path (without extension) """
+        Path(path).parent.absolute().mkdir(parents=True, exist_ok=True)
+        self.stream_path = path + self.EXTENSION
+        self.file = open(self.stream_path, 'w')
+        self.buffer = []
+        self.written = 0
+        self.best_quality = None
+        self.last_flush = perf_counter_ns()
+        atexit.register(self.close)
         
     def add_record(self, quality: int):
         """ Adds a new record to the trace """
-        record = (self.timer.elapsed(), quality)
+        record = (self.timer.elapsed(), quality + self.quality_offset)
+        if len(self.list) == self.list.maxlen:
+            self.dropped_records += 1
         self.list.append(record)
         self.graph_stats.append((self.graph._accesses_count, self.graph._vertex_cover_check_count))
         
+        if self.file is not None:
+            self.buffer.append(record)
+            improved = self.best_quality is None or record[1] < self.best_quality
+            if improved:
+                self.best_quality = record[1]
+            if improved or len(self.buffer) >= TRACE_FLUSH_RECORDS or perf_counter_ns() - self.last_flush >= TRACE_FLUSH_INTERVAL_NS:
+                self.flush()
+        
+    def flush(self):
+        """ Appends the buffered records to the streamed trace file """
+        if self.file is None:
+            return
+        lines = [str(record)[1:-1] for record in self.buffer]
+        if lines:
+            # records are separated by new lines, without one after the last record
+            self.file.write(('\n' if self.written else '') + '\n'.join(lines))
+            self.file.flush()
+            self.written += len(lines)
+        self.buffer = []
+        self.last_flush = perf_counter_ns()
+        
+    def close(self):
+        """ Writes the remaining records and closes the streamed trace file """
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+        atexit.unregister(self.close)
+        
     def save(self, path: str):
-        """ Saves the trace to a file """
+        """ Saves the trace to a file, or finishes writing it if it is streamed there """
+        if self.file is not None and path + self.EXTENSION == self.stream_path:
+            self.close()
+            print(f"Trace saved to {self.stream_path}")
+            return
+        
         Path(path).parent.absolute().mkdir(parents=True, exist_ok=True)
         path = path + self.EXTENSION
         
@@ -70,25 +193,29 @@ class Trace:
                     f.write('\n')
         print(f"Trace saved to {path}")
         
-    def save_stats(self, path: str):
-        """ Saves the graph stats to JSON"""
-        Path(path).parent.absolute().mkdir(parents=True, exist_ok=True)
-        path = path + self.STATS_EXTENSION
-        
-        # Create the dictionary
-        data = {
+    def get_stats(self) -> dict:
+        """ Returns the records and graph stats of the trace, with the run info, as a dictionary """
+        return {
                 "sys_info": get_sys_info(),
                 "time": [record[0] for record in self.list],
                 "quality": [record[1] for record in self.list],
                 "graph_reads": [stat[0] for stat in self.graph_stats],
                 "vertex_cover_checks": [stat[1] for stat in self.graph_stats],
+                "dropped_records": self.dropped_records,
+                "cover_cache": self.graph.cover_cache.get_stats(),
                 "current_memory_usage": self.current_memory_usage,
-                "peak_memory_usage": self.peak_memory_usage
+                "peak_memory_usage": self.peak_memory_usage,
+                "profile": self.profile
             }
-            
+        
+    def save_stats(self, path: str):
+        """ Saves the graph stats to JSON"""
+        Path(path).parent.absolute().mkdir(parents=True, exist_ok=True)
+        path = path + self.STATS_EXTENSION
+        
         # Save to JSON
         with open(path, 'w') as f:
-            f.write(json.dumps(data, indent=4))  
+            f.write(json.dumps(self.get_stats(), indent=4))  
         print(f"Trace stats saved to {path}")
                 
                 
@@ -2,51 +2,131 @@
 This file contains the common functions used in vertex cover algorithms.
 """
 
-import networkx as nx
-from typing import List, Set
-from graph import Graph
+import random
+import numpy as np
+from typing import Iterable, List, Set
+from graph import Graph, Bitset_Cover, Cover
+
+
+class Index_Pool:
+    """
+    Indexed set of integer ids (edges or vertices) supporting O(1) insertion, deletion, membership and uniform sampling.
+    
+    Attributes:
+        - items: list of the ids in the pool, in no particular order
+        - positions: list mapping each id to its index in items, -1 if not in the pool
+    """
+    
+    def __init__(self, capacity: int, ids: Iterable[int] = ()):
+        """
+        Constructor for the Index_Pool class
+        
+        :param capacity: ids range from 0 to capacity - 1
+        :param ids: ids initially in the pool
+        """
+        self.items=list(ids)
+        self.positions=[-1]*capacity
+        for idx, item in enumerate(self.items):
+            self.positions[item]=idx
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return self.positions[item]!=-1
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def add(self, item: int):
+        if self.positions[item]==-1:
+            self.positions[item]=len(self.items)
+            self.items.append(item)
+
+    def remove(self, item: int):
+        """Removes the id by swapping the last item into its place."""
+        idx=self.positions[item]
+        if idx==-1:
+            raise KeyError(item)
+        last=self.items.pop()
+        if last!=item:
+            self.items[idx]=last
+            self.positions[last]=idx
+        self.positions[item]=-1
+
+    def update(self, ids: Iterable[int]):
+        for item in ids:
+            self.add(item)
+
+    def difference_update(self, ids: Iterable[int]):
+        for item in ids:
+            self.remove(item)
+
+    def sample(self) -> int:
+        """Returns an id of the pool chosen uniformly at random."""
+        return self.items[random.randrange(len(self.items))]
+
 
 class Vertex_Cover(Graph):
     """
     This class is inherited from the Graph class:
-    - keys are the nodes
-    - values are the lists of nodes that are adjacent to the key node
+    - nodes are the integers from 1 to v
+    - edges are identified by their integer id (see Graph.edges)
     
     Graph class Attributes:
         - v: int - number of nodes
         - e: int - number of edges
-        - adj: dict - adjacency lists representation of thr graph as described above
+        - indptr, indices, edge_ids: np.ndarray - CSR representation of the graph
         - _accesses_count: int - number of accesses to the graph
 
     Vertex_Cover class Attributes:
         - solution: set of chosen vertices
         - quality: number of chosen vertices
-        - is_vertex_cover: True if the solution is a vertex cover
+        - in_solution: np.ndarray - True for the chosen vertices
+        - uncovered_degree: np.ndarray - gain (or loss) in covered edges when adding (or removing) each vertex
+        - uncovered_edges: Index_Pool of the ids of the edges not covered by the solution
+        - uncovered_count: number of edges not covered by the solution
+        - solution_key: Zobrist hash of the solution (see Graph.get_cover_key), updated by add_vertex() and remove_vertex()
     """
     
-    def __init__(self, path: str):
+    def __init__(self, path: str, use_cache: bool = True):
         """
         Constructor for the Vertex_Cover class
         
         :param path: path to the graph dataset
+        :param use_cache: load the graph from its binary sidecar cache (see Graph)
         """
-        Graph.__init__(self, path)
-        self.solution=set()
-        self.quality=0
-        self.covered_edges=set()
-        self.uncovered_edges=self.get_all_edges()
+        Graph.__init__(self, path, use_cache)
+
+    def init_graph(self):
+        """Starts from an empty solution once the graph is loaded."""
+        Graph.init_graph(self)
+        self.set_solution([])
+        # building the empty starting solution is not a check made by the algorithm
+        self._vertex_cover_check_count=0
 
     def is_vertex_cover_new(self):
         """Use this only if you used add_vertex() and remove_vertex() to manipulate the solution, 
         or else you may want to call fix_uncovered_edges() first"""
-        return len(self.uncovered_edges)==0
+        return self.uncovered_count==0
 
-    def set_solution(self,solution: List[int]):
-        """The solution is initially set to be empty. Please set the initial solution if you have one."""
+    def set_solution(self,solution: Cover):
+        """The solution is initially set to be empty. Please set the initial solution if you have one (list of nodes or Bitset_Cover)."""
         self.solution=set(solution)
+        self.fix_all()
 
     def get_solution(self):
         return list(self.solution)
+
+    def get_cover_key(self, vertex_cover: Cover):
+        """The key of the solution itself is maintained incrementally rather than recomputed."""
+        if vertex_cover is self.solution:
+            return self.solution_key, len(self.solution)
+        return Graph.get_cover_key(self, vertex_cover)
+
+    def get_solution_bitset(self) -> Bitset_Cover:
+        """Returns the solution packed as a Bitset_Cover, e.g. to keep many solutions around or compare them cheaply."""
+        return Bitset_Cover.from_mask(self.in_solution)
     
     def get_solution_quality_new(self):
         return self.quality
@@ -54,7 +134,7 @@ class Vertex_Cover(Graph):
     def get_covered_edges_new(self):
         """I'm keeping this at this time, but I think checking the uncovered edges makes more sense.
         Let Zhaonan know if you have any thoughts on this."""
-        return self.covered_edges
+        return self.get_all_edges().difference(self.uncovered_edges)
 
     def get_uncovered_edges_new(self):
         """Use this only if you used add_vertex() and remove_vertex() to manipulate the solution, 
@@ -66,10 +146,16 @@ class Vertex_Cover(Graph):
 
     def add_vertex(self,node):
         """Just add the node. This function handles the rest."""
-        changes=self.get_changes(node)
-        self.covered_edges.update(changes)
-        self.uncovered_edges.difference_update(changes)
+        if self.in_solution[node]:
+            return
+        neighbours=self.get_neighbours(node)
+        changes=self.get_node_edges(node)[~self.in_solution[neighbours]]
+        self.uncovered_edges.difference_update(changes.tolist())
+        self.uncovered_count-=len(changes)
+        self.uncovered_degree[neighbours]-=1
+        self.in_solution[node]=True
         self.solution.add(node)
+        self.solution_key^=int(self.zobrist_keys[node])
         self.update_solution()
 
     def add_vertices(self,nodes:List[int]):
@@ -78,34 +164,35 @@ class Vertex_Cover(Graph):
     
     def remove_vertex(self,node):
         """Just remove the node. This function handles the rest."""
-        changes=self.get_changes(node)
-        self.covered_edges.difference_update(changes)
-        self.uncovered_edges.update(changes)
         self.solution.remove(node)
+        neighbours=self.get_neighbours(node)
+        changes=self.get_node_edges(node)[~self.in_solution[neighbours]]
+        self.uncovered_edges.update(changes.tolist())
+        self.uncovered_count+=len(changes)
+        self.uncovered_degree[neighbours]+=1
+        self.in_solution[node]=False
+        self.solution_key^=int(self.zobrist_keys[node])
         self.update_solution()
 
     def get_add_candidates(self) -> List[int]:
         """Returns the (reasonable) candidates of vertices to be added into the solution."""
-        add_candidates=set()
-        for node1, node2 in iter(self.get_uncovered_edges_new()):
-            add_candidates.add(node1)
-            add_candidates.add(node2)
-        return list(add_candidates)
+        return np.unique(self.edges[self.uncovered_edges.items]).tolist()
+
+    def sample_uncovered_edge(self) -> List[int]:
+        """Returns the endpoints of an uncovered edge chosen uniformly at random, in O(1)."""
+        return self.edges[self.uncovered_edges.sample()].tolist()
 
     def get_changes(self,node):
-        """Returns the changed edges (either from covered to uncovered, or the other way) if a node is added/removed."""
-        changes=set()
-        for neighbor in iter(set(self.get_neighbours(node)).difference(self.solution)):
-            changes.add(frozenset([node,neighbor]))
-        return changes
+        """Returns the ids of the changed edges (either from covered to uncovered, or the other way) if a node is added/removed."""
+        return set(self.get_node_edges(node)[~self.in_solution[self.get_neighbours(node)]].tolist())
 
     def get_loss(self,node):
         """Returns the number of loss in covered edges if a node is removed."""
-        return len(set(self.get_neighbours(node)).difference(self.solution))
+        return int(self.uncovered_degree[node])
 
     def get_gain(self,node):
         """Returns the number of gain in covered edges if a node is added."""
-        return len(set(self.get_neighbours(node)).difference(self.solution))
+        return int(self.uncovered_degree[node])
 
     def remove_vertices(self,nodes:List[int]):
         for node in nodes:
@@ -116,11 +203,20 @@ class Vertex_Cover(Graph):
         self.remove_vertices(nodes_remove)
 
     def fix_covered_edges(self):
-        self.covered_edges=self.get_covered_edges(self.solution)
+        """Rebuilds the per-vertex counters from the solution, needed if the solution was changed directly."""
+        self.in_solution=np.zeros(self.v+1,dtype=bool)
+        self.in_solution[list(self.solution)]=True
+        self.solution_key=int(np.bitwise_xor.reduce(self.get_zobrist_keys()[self.in_solution]))
+        # uncovered_degree[node] is the number of the node's neighbours outside of the solution, i.e. the edges
+        # a node outside of the solution would cover if added, or that a node in the solution alone covers
+        outside=np.concatenate(([0],np.cumsum(~self.in_solution[self.indices])))
+        self.uncovered_degree=outside[self.indptr[1:]]-outside[self.indptr[:-1]]
         self.update_solution()
 
     def fix_uncovered_edges(self):
-        self.uncovered_edges=self.get_uncovered_edges(self.solution)
+        uncovered=np.flatnonzero(~self.get_covered_mask(self.solution))
+        self.uncovered_edges=Index_Pool(len(self.edges),uncovered.tolist())
+        self.uncovered_count=len(uncovered)
         self.update_solution()
 
     def fix_all(self):
@@ -128,10 +224,14 @@ class Vertex_Cover(Graph):
         self.fix_uncovered_edges()
 
     def get_lower_bound(self):
-        """Returns a lower bound for the current partial solution using maximal matching (make sure to install nx)"""
-        G=nx.Graph()
-        G.add_edges_from(self.get_uncovered_edges_new())
-        return len(nx.maximal_matching(G))+self.get_solution_quality_new()
+        """Returns a lower bound for the current partial solution using a greedy maximal matching of the uncovered edges"""
+        matched=set()
+        matching=0
+        for u, w in self.edges[self.uncovered_edges.items].tolist():
+            if u not in matched and w not in matched:
+                matched.update((u,w))
+                matching+=1
+        return matching+self.get_solution_quality_new()
 
     def get_upper_bound(self):
         """Returns an upper bound for the current partial solution using greedy"""